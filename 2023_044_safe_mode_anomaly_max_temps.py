@@ -27,6 +27,15 @@ from cheta import fetch_eng
 import Ska.engarchive.fetch_eng as fetch_eng2
 import Chandra.Time
 from cxotime import CxoTime
+import pipeline_stats
+import chandra_time_utils
+import telem_series
+import rate_of_change
+import event_windows
+import msid_catalog
+import exceedance
+import unit_conversion
+import msid_sketch
 
 
 # In[5]:
@@ -54,33 +63,13 @@ pio.renderers.default = "notebook"
 
 
 def maude_query(msid, t1, t2, all_points=True):
-    # (base URL)/<CHANNEL>/<querytype>.<format>?<query options separated by &>
-    # https://occweb.cfa.harvard.edu/maude/mrest/FLIGHT/msid.json?m=STAT_1DAY_MIN_OOBTHR18&ts=2015.001&tp=2016.001
-    
-    # All Points
-    if all_points is True:
-        # All Points
-        base_url_constructor = 'https://occweb.cfa.harvard.edu/maude/mrest/FLIGHT/msid.json?m={}&ts={}&tp={}&ap=t'
-    else:
-        # Reduced Points
-        base_url_constructor = 'https://occweb.cfa.harvard.edu/maude/mrest/FLIGHT/msid.json?m={}&ts={}&tp={}'
-
-    url = base_url_constructor.format(msid.lower(), t1, t2)
-
-    try:
-        jsondata = requests.get(url).json()
-        data = pd.DataFrame({'date':pd.to_datetime(jsondata['data-fmt-1']['times'], format='%Y%j%H%M%S%f'),
-                       'data':jsondata['data-fmt-1']['values']})
-        data["data"] = pd.to_numeric(data["data"])
-    except:
-        data = pd.DataFrame({'date':[None,], 'data':[None,]})
-
-    return data
+    # MAUDE data as a "date"/"data" DataFrame; no data gives an empty (typed) frame.
+    # Use telem_series.maude_series() directly to keep the numpy arrays.
+    return telem_series.maude_series(msid, t1, t2, all_points=all_points).to_pandas()
 
 
 def ska_query(msid, t1, t2, stat='daily'):
-    data = fetch_eng.Msid(msid, t1, t2, stat=stat)
-    return pd.DataFrame({'date': data.times, 'data': data.vals})
+    return telem_series.ska_series(msid, t1, t2, stat=stat).to_pandas(dates=False)
 
 
 def get_warning_low(msid):
@@ -140,6 +129,7 @@ thermal_MSIDs = therm_list.iloc[:,1]
 msids = [v.strip() for v in thermal_MSIDs.values if 'None' not in v]
 t1 = '2000:200:00:00:00.000' 
 t2 = '2023:051:00:00:00.000'
+report_unit = 'DEGF'  # all temperature tables are reported in this unit (DEGC, DEGF or K)
 
 # List of numeric MSIDs
 num_msid = []
@@ -168,8 +158,21 @@ print(num_msid)
 
 
 # Safe Mode Anomaly Time Range
-t_anom_start = Chandra.Time.DateTime('2023:044:17:41:00').secs
-t_anom_stop = Chandra.Time.DateTime('2023:055:00:00:00').secs
+t_anom_start = chandra_time_utils.date2secs_cached('2023:044:17:41:00')
+t_anom_stop = chandra_time_utils.date2secs_cached('2023:055:00:00:00')
+
+# Exclusion windows: safe mode transitions detected from CONLOFP (cached on disk by time range),
+# plus the CTU-A swaps / thermal control disables that have no state source configured yet
+mission_events = event_windows.get_events(t1, t2, manual=event_windows.ANOMALY_2023_044_MANUAL)
+# Detected safe mode entries must match the hand-typed ones they replaced
+print('Safe mode transitions not detected:', event_windows.check_events(mission_events, t1, t2))
+
+# MSID metadata, one file read (built from the TDB and saved on the first run)
+msid_meta = msid_catalog.get()
+
+# Per-stage timing/counters (pipeline_stats.summary() after the loop); debug prints off by default
+pipeline_stats.enable()
+verbose = False
 
 # Data for numeric MSIDs
 data_num = {}
@@ -180,31 +183,33 @@ msid_anom_min = []
 anom_max_df = pd.DataFrame(columns=['MSID', 'Technical Name', 'Max Temp', 'Units', 'Caution High', 'Warning High', 'Time of Max'])
 anom_min_df = pd.DataFrame(columns=['MSID', 'Technical Name', 'Min Temp', 'Units', 'Caution Low', 'Warning Low', 'Time  of Min'])
 
+# Mission extremes of dT/dt (units per hour), from the same good samples as the max/min scan
+rate_df = pd.DataFrame(columns=['MSID', 'Technical Name', 'Units', 'Max Heating Rate', 'Time of Max Heating', 'Max Cooling Rate', 'Time of Max Cooling'])
+rate_flags = {}  # MSID -> [(start, stop, peak rate), ...] windows above rate_threshold
+rate_threshold = 10 # units per hour
+
+# Per-MSID distribution sketches (msid_sketch), fed from the same pass and good samples; the
+# store only adds samples newer than what it already holds, so re-running the loop is safe
+sketch_store = msid_sketch.SketchStore()
+
 
 # Iterate through numeric MSIDs
 for m in num_msid:
     fetch_eng.data_source.set('cxc')
-    data_num[m] = fetch_eng.Msid(m, t1, t2,stat="5min")
-    data_num[m].filter_bad(copy=True)
+    with pipeline_stats.stage("fetch", m):
+        data_num[m] = fetch_eng.Msid(m, t1, t2,stat="5min")
+    pipeline_stats.count("fetch", m, nbytes=data_num[m].times.nbytes + data_num[m].vals.nbytes, samples=len(data_num[m].vals))
+    with pipeline_stats.stage("filter_bad", m):
+        data_num[m].filter_bad(copy=True)
    
 
-    # Technical Name
-    try: 
-        tech_name = data_num[m].tdb.technical_name
-        
-    except KeyError:
-        tech_name = "Not in TDB"
-       
-    
-    # Units
-    try:
-        units = data_num[m].unit
-        print(units)
-    except KeyError:
-        units = "None Found"
+    # Technical Name / Units from the metadata catalog ("Not in TDB" / "None Found" if missing)
+    tech_name = msid_meta.technical_name(m)
+    units = msid_meta.unit(m)
      
     
     # Limits
+    limits_stage = pipeline_stats.start("limits", m)
     try:    
         safety_limits = pylimmon.get_mission_safety_limits(m)
         
@@ -216,7 +221,8 @@ for m in num_msid:
         current_warning_low  = safety_limits["warning_low"][-1]
         current_caution_high = safety_limits["caution_high"][-1]
         current_caution_low  = safety_limits["caution_low"][-1]
-        print(m, 'tdb warning high is:',current_warning_high, 'tdb caution high is', current_caution_high)
+        if verbose:
+            print(m, 'tdb warning high is:',current_warning_high, 'tdb caution high is', current_caution_high)
 
     elif safety_limits is None:
         
@@ -225,7 +231,8 @@ for m in num_msid:
             current_warning_low = pylimmon.get_latest_glimmon_limits(m)["warning_low"]
             current_caution_high = pylimmon.get_latest_glimmon_limits(m)["caution_high"]
             current_caution_low = pylimmon.get_latest_glimmon_limits(m)["caution_low"]
-            print(m, 'glimmon warning high is:',current_warning_high, 'glimmon caution high is:', current_caution_high)
+            if verbose:
+                print(m, 'glimmon warning high is:',current_warning_high, 'glimmon caution high is:', current_caution_high)
             
         except TypeError:
             current_warning_high = 9999
@@ -235,44 +242,22 @@ for m in num_msid:
     
     else:
         print('no tdb or glimmon limits for:', msid_anom)
+    pipeline_stats.stop(limits_stage)
     
-    
-    print(m, "-->", "CH =", current_caution_high, ' ', "WH = ", current_warning_high)
+    if verbose:
+        print(m, "-->", "CH =", current_caution_high, ' ', "WH = ", current_warning_high)
     
     
-    # Spacecraft Mode Transition Filters
-    pad = 300 # seconds
-    ind1 = data_num[m].times < (CxoTime('2022:293:16:27:49.000').secs - pad) # 2023:293 Safe Mode transition
-    ind2 = data_num[m].times > (CxoTime('2022:293:16:27:49.000').secs + pad)
-    ind3 = data_num[m].times < (CxoTime('2023:044:17:41:07.000').secs - pad) # 2023:044 Safe Mode transition 
-    ind4 = data_num[m].times > (CxoTime('2023:044:17:41:07.000').secs + pad)
-    ind5 = data_num[m].times < (CxoTime('2023:045:03:32:39.000').secs - pad) # 2023:045 Swap to CTU-A
-    ind6 = data_num[m].times > (CxoTime('2023:045:03:32:39.000').secs + pad)
-    ind7 = data_num[m].times < (CxoTime('2023:047:07:33:47.000').secs - pad) # 2023:047 Safe Mode transition
-    ind8 = data_num[m].times > (CxoTime('2023:047:07:33:47.000').secs + pad)
-    ind9 = data_num[m].times < (CxoTime('2023:048:03:17:11.000').secs - pad) # 2023:048 Swap to CTU-A
-    ind10 = data_num[m].times > (CxoTime('2023:048:03:17:11.000').secs + pad)
-    good_ind_1 = ind1 | ind2
-    good_ind_2 = ind3 | ind4
-    good_ind_3 = ind5 | ind6
-    good_ind_4 = ind7 | ind8
-    good_ind_5 = ind9 | ind10
-    good_ind_6 = data_num[m].vals < 250
-    
-    # Thermal Control Disable Filters
-    pad2 = 70 # seconds
-    ind11 = data_num[m].times < (CxoTime('2023:045:03:29:49.010').secs - pad2) # 2023:045 Thermal Control Disabled
-    ind12 = data_num[m].times > (CxoTime('2023:045:04:48:37.150').secs + pad2)
-    ind13 = data_num[m].times < (CxoTime('2023:047:07:33:33.163').secs - pad2) # 2023:047 Thermal Control Disabled
-    ind14 = data_num[m].times > (CxoTime('2023:047:07:34:48.125').secs + pad2)
-    ind15 = data_num[m].times < (CxoTime('2023:048:03:14:30.531').secs - pad2) # 2023:048 Thermal Control Disabled
-    ind16 = data_num[m].times > (CxoTime('2023:048:03:56:31.086').secs + pad2)
-    good_ind_7 = ind11 | ind12
-    good_ind_8 = ind13 | ind14
-    good_ind_9 = ind15 | ind16
-     
-    good_ind_all = good_ind_1 & good_ind_2 & good_ind_3 & good_ind_4 & good_ind_5 & good_ind_6 & good_ind_7 & good_ind_8 & good_ind_9
+    mask_stage = pipeline_stats.start("mask", m)
+    # Exclude safe mode transitions, CTU swaps and thermal control disables (see event_windows)
+    good_ind_all = event_windows.good_mask(data_num[m].times, mission_events) & (data_num[m].vals < 250)
+    pipeline_stats.stop(mask_stage)
   
+    reduce_stage = pipeline_stats.start("reduce", m)
+    pipeline_stats.count("reduce", m, samples=int(np.count_nonzero(good_ind_all)))
+
+    # 5-min means of the good samples into the MSID's sketch (percentile questions without a refetch)
+    sketch_store.update(m, data_num[m].times[good_ind_all], data_num[m].vals[good_ind_all])
 
     # Max temps
     try:
@@ -280,23 +265,34 @@ for m in num_msid:
         max_t = max(max_t_array)                            # max temp value over entire mission
     except ValueError as msg:
         # add message
-        print()
+        pipeline_stats.stop(reduce_stage)
         continue
     index_max = np.argmax(max_t_array)                      # index of mission high
     time_of_max = data_num[m].times[index_max]              # time of mission high
-    time_of_max_1 = Chandra.Time.secs2date(time_of_max)
+    time_of_max_1 = chandra_time_utils.secs2date(time_of_max)
     
-    print('max temp =', max_t, '---', 'time of max =', time_of_max_1)
+    if verbose:
+        print('max temp =', max_t, '---', 'time of max =', time_of_max_1)
     
     # Min temps
     try:
         min_t_array = data_num[m].mins[good_ind_all]
         min_t = min(min_t_array)
     except ValueError:
+        pipeline_stats.stop(reduce_stage)
         continue
     index_min = np.argmin(min_t_array)
     time_of_min = data_num[m].times[index_min]
-    time_of_min_1 = Chandra.Time.secs2date(time_of_min)
+    time_of_min_1 = chandra_time_utils.secs2date(time_of_min)
+
+    # Rate of change (dT/dt) over 1-hour windows, same pass / same good samples
+    rate_times, rates = rate_of_change.rates(data_num[m].times, data_num[m].vals, good=good_ind_all)
+    max_rate, t_max_rate, min_rate, t_min_rate = rate_of_change.rate_extremes(rate_times, rates)
+    if t_max_rate is not None:
+        rate_df.loc[len(rate_df)] = [m, tech_name, units, max_rate, chandra_time_utils.secs2date(t_max_rate),
+                                     min_rate, chandra_time_utils.secs2date(t_min_rate)]
+        rate_flags[m] = rate_of_change.flag_windows(rate_times, rates, rate_threshold)
+    pipeline_stats.stop(reduce_stage)
     
     
     # If mission max temp occurred during anomaly, append to "anom_max_df"
@@ -314,6 +310,7 @@ for m in num_msid:
 
 print(msid_anom_max)
 print(len(anom_max_df.iloc[:,0]))
+pipeline_stats.summary()
 
 
 # #### Anomaly Mission Max Table: 
@@ -321,6 +318,11 @@ print(len(anom_max_df.iloc[:,0]))
 # In[21]:
 
 
+# Report boundary: temperatures and limits in report_unit, rates scaled only (idempotent, safe to re-run)
+unit_conversion.normalize_table(anom_max_df, ['Max Temp', 'Caution High', 'Warning High'], report_unit)
+unit_conversion.normalize_table(anom_min_df, ['Min Temp', 'Caution Low', 'Warning Low'], report_unit)
+unit_conversion.normalize_table(rate_df, [], report_unit, delta_cols=['Max Heating Rate', 'Max Cooling Rate'])
+
 pd.set_option('display.max_rows', None)
 anom_max_df
 
@@ -337,8 +339,9 @@ anom_min_df
 
 
 # Write Dataframe to .csv
-anom_max_df.to_csv('C:/Users/christian.anderson/Documents/Anomalies/2023/2023_44_Safe_Mode/max_min_data/2023_044_anomaly_mission_maxes_v3.csv')
-anom_min_df.to_csv('C:/Users/christian.anderson/Documents/Anomalies/2023/2023_44_Safe_Mode/max_min_data/2023_044_anomaly_mission_mins.csv')
+with pipeline_stats.stage("write"):
+    anom_max_df.to_csv('C:/Users/christian.anderson/Documents/Anomalies/2023/2023_44_Safe_Mode/max_min_data/2023_044_anomaly_mission_maxes_v3.csv')
+    anom_min_df.to_csv('C:/Users/christian.anderson/Documents/Anomalies/2023/2023_44_Safe_Mode/max_min_data/2023_044_anomaly_mission_mins.csv')
 
 
 # # Limit Violation Data
@@ -347,39 +350,40 @@ anom_min_df.to_csv('C:/Users/christian.anderson/Documents/Anomalies/2023/2023_44
 
 
 # Safe Mode Anomaly Time Range
-t_anom_start = Chandra.Time.DateTime('2023:044:17:41:00').secs
-t_anom_stop = Chandra.Time.DateTime('2023:055:00:00:00').secs
+t_anom_start = chandra_time_utils.date2secs_cached('2023:044:17:41:00')
+t_anom_stop = chandra_time_utils.date2secs_cached('2023:055:00:00:00')
+
+anomaly_events = event_windows.get_events(t_anom_start, t_anom_stop, manual=event_windows.ANOMALY_2023_044_MANUAL)
+print('Safe mode transitions not detected:', event_windows.check_events(anomaly_events, t_anom_start, t_anom_stop))
+msid_meta = msid_catalog.get()
 
 warning_limit_violations = pd.DataFrame(columns=['MSID', 'Technical Name', 'Max Temp', 'Units', 'Warning High', 'Time Spent Above Limit (Hours)'])
 caution_limit_violations = pd.DataFrame(columns=['MSID', 'Technical Name', 'Max Temp', 'Units', 'Caution High', 'Time Spent Above Limit (Hours)'])
 
 data_anomaly = {}
+anomaly_curves = {}       # exceedance curves for the limit sweep below
+caution_highs = {}
 
 for msid_anom in num_msid:
     fetch_eng.data_source.set('maude') #cxc
     # when pulling from ska, default is 5min. For full res, stat=None
-    data_anomaly[msid_anom] = fetch_eng.Msid(msid_anom, t_anom_start, t_anom_stop)
-    data_anomaly[msid_anom].filter_bad(copy=True)
+    with pipeline_stats.stage("fetch", msid_anom):
+        data_anomaly[msid_anom] = fetch_eng.Msid(msid_anom, t_anom_start, t_anom_stop)
+    pipeline_stats.count("fetch", msid_anom, nbytes=data_anomaly[msid_anom].times.nbytes + data_anomaly[msid_anom].vals.nbytes,
+                         samples=len(data_anomaly[msid_anom].vals))
+    with pipeline_stats.stage("filter_bad", msid_anom):
+        data_anomaly[msid_anom].filter_bad(copy=True)
     
-    print(msid_anom)
+    if verbose:
+        print(msid_anom)
     
-    # Technical Name
-    try: 
-        tech_name = data_anomaly[msid_anom].tdb.technical_name
-        
-    except KeyError:
-        tech_name = "Not in TDB"
-       
-    
-    # Units
-    try:
-        units = data_anomaly[msid_anom].unit
-        print(units)
-    except KeyError:
-        units = "None Found"
+    # Technical Name / Units from the metadata catalog ("Not in TDB" / "None Found" if missing)
+    tech_name = msid_meta.technical_name(msid_anom)
+    units = msid_meta.unit(msid_anom)
     
 
     # Limits
+    limits_stage = pipeline_stats.start("limits", msid_anom)
     try:    
         safety_limits = pylimmon.get_mission_safety_limits(msid_anom)
     
@@ -392,7 +396,8 @@ for msid_anom in num_msid:
         current_warning_low  = safety_limits["warning_low"][-1]
         current_caution_high = safety_limits["caution_high"][-1]
         current_caution_low  = safety_limits["caution_low"][-1]
-        print(msid_anom, 'tdb warning high is:',current_warning_high, 'tdb caution high is', current_caution_high)
+        if verbose:
+            print(msid_anom, 'tdb warning high is:',current_warning_high, 'tdb caution high is', current_caution_high)
 
     elif safety_limits is None:
         
@@ -401,7 +406,8 @@ for msid_anom in num_msid:
             current_warning_low  = pylimmon.get_latest_glimmon_limits(msid_anom)["warning_low"]
             current_caution_high = pylimmon.get_latest_glimmon_limits(msid_anom)["caution_high"]
             current_caution_low = pylimmon.get_latest_glimmon_limits(msid_anom)["caution_low"]
-            print(msid_anom, 'glimmon warning high is:',current_warning_high, 'glimmon caution high is:', current_caution_high)
+            if verbose:
+                print(msid_anom, 'glimmon warning high is:',current_warning_high, 'glimmon caution high is:', current_caution_high)
             
         except TypeError:
             # add message
@@ -412,42 +418,20 @@ for msid_anom in num_msid:
     
     else:
         print('no tdb or glimmon limits for:', msid_anom)
+    pipeline_stats.stop(limits_stage)
     
     
-    # Spacecraft Mode Transition Filters
-    pad = 300 # seconds
-    ind1 = data_anomaly[msid_anom].times < (CxoTime('2022:293:16:27:49.000').secs - pad) # 2023:293 Safe Mode transition
-    ind2 = data_anomaly[msid_anom].times > (CxoTime('2022:293:16:27:49.000').secs + pad)
-    ind3 = data_anomaly[msid_anom].times < (CxoTime('2023:044:17:41:07.000').secs - pad) # 2023:044 Safe Mode transition 
-    ind4 = data_anomaly[msid_anom].times > (CxoTime('2023:044:17:41:07.000').secs + pad)
-    ind5 = data_anomaly[msid_anom].times < (CxoTime('2023:045:03:32:39.000').secs - pad) # 2023:045 Swap to CTU-A
-    ind6 = data_anomaly[msid_anom].times > (CxoTime('2023:045:03:32:39.000').secs + pad)
-    ind7 = data_anomaly[msid_anom].times < (CxoTime('2023:047:07:33:47.000').secs - pad) # 2023:047 Safe Mode transition
-    ind8 = data_anomaly[msid_anom].times > (CxoTime('2023:047:07:33:47.000').secs + pad)
-    ind9 = data_anomaly[msid_anom].times < (CxoTime('2023:048:03:17:11.000').secs - pad) # 2023:048 Swap to CTU-A
-    ind10 = data_anomaly[msid_anom].times > (CxoTime('2023:048:03:17:11.000').secs + pad)
-    good_ind_1 = ind1 | ind2
-    good_ind_2 = ind3 | ind4
-    good_ind_3 = ind5 | ind6
-    good_ind_4 = ind7 | ind8
-    good_ind_5 = ind9 | ind10
-    good_ind_6 = data_anomaly[msid_anom].vals < 250
-    
-    # Thermal Control Swap Filters
-    pad2 = 70 # seconds
-    ind11 = data_anomaly[msid_anom].times < (CxoTime('2023:045:03:29:49.010').secs - pad2) # 2023:045 Thermal Control Disabled
-    ind12 = data_anomaly[msid_anom].times > (CxoTime('2023:045:04:48:37.150').secs + pad2)
-    ind13 = data_anomaly[msid_anom].times < (CxoTime('2023:047:07:33:33.163').secs - pad2) # 2023:047 Thermal Control Disabled
-    ind14 = data_anomaly[msid_anom].times > (CxoTime('2023:047:07:34:48.125').secs + pad2)
-    ind15 = data_anomaly[msid_anom].times < (CxoTime('2023:048:03:14:30.531').secs - pad2) # 2023:048 Thermal Control Disabled
-    ind16 = data_anomaly[msid_anom].times > (CxoTime('2023:048:03:56:31.086').secs + pad2)
-    good_ind_7 = ind11 | ind12
-    good_ind_8 = ind13 | ind14
-    good_ind_9 = ind15 | ind16
-     
-    all_good_ind = good_ind_1 & good_ind_2 & good_ind_3 & good_ind_4 & good_ind_5 & good_ind_6 & good_ind_7 & good_ind_8 & good_ind_9
-    print(all_good_ind)
+    mask_stage = pipeline_stats.start("mask", msid_anom)
+    # Exclude safe mode transitions, CTU swaps and thermal control disables (see event_windows)
+    all_good_ind = event_windows.good_mask(data_anomaly[msid_anom].times, anomaly_events) & (data_anomaly[msid_anom].vals < 250)
+    pipeline_stats.stop(mask_stage)
     
+    reduce_stage = pipeline_stats.start("reduce", msid_anom)
+    pipeline_stats.count("reduce", msid_anom, samples=int(np.count_nonzero(all_good_ind)))
+
+    # Sorted once here; any number of candidate limits is answered later without another pass
+    anomaly_curves[msid_anom] = exceedance.ExceedanceCurve(data_anomaly[msid_anom].times, data_anomaly[msid_anom].vals, all_good_ind)
+    caution_highs[msid_anom] = current_caution_high
 
     # Calculate Warning Violation time duration: 
     warning_violation_bools = data_anomaly[msid_anom].vals[all_good_ind] > current_warning_high
@@ -465,8 +449,9 @@ for msid_anom in num_msid:
     t_tot_caution = np.sum([stop - start for start, stop in time_bounds_caution])
     t_tot_caution_hours = t_tot_caution*(1/60)*(1/60)
     
-    print('WARNING DURATION IS:', t_tot_warning_hours)
-    print('CAUTION DURATION IS:', t_tot_caution_hours)
+    if verbose:
+        print('WARNING DURATION IS:', t_tot_warning_hours)
+        print('CAUTION DURATION IS:', t_tot_caution_hours)
 
     
     # Calculate Maximum temperature:
@@ -476,12 +461,12 @@ for msid_anom in num_msid:
         ind_max = np.argmax(max_temp_array)                               # index of anomaly high
         t_array = data_anomaly[msid_anom].times[all_good_ind]             # time of anomaly high
         t_max = t_array[ind_max]
-        t_max_1 = Chandra.Time.secs2date(t_max)
-        print('TIME OF MAX TEMP:', t_max_1)                                # max temp value over anomaly time range
+        t_max_1 = chandra_time_utils.secs2date(t_max)
+        if verbose:
+            print('TIME OF MAX TEMP:', t_max_1)                            # max temp value over anomaly time range
     except ValueError:
         max_temp = 9999
-
-    print('------------------------------------------')
+    pipeline_stats.stop(reduce_stage)
     
     if t_tot_warning != 0:
         warning_limit_violations.loc[len(warning_limit_violations)] = [msid_anom, tech_name, max_temp, units, current_warning_high, t_tot_warning_hours]
@@ -495,11 +480,30 @@ for msid_anom in num_msid:
 
 
 
+# #### Limit Sweep: hours above (caution high + offset) for MSIDs that came within 10 degrees of caution high
+
+# In[ ]:
+
+
+limit_offsets = np.arange(-10, 10.5, 0.5)
+near_caution = [m for m, c in anomaly_curves.items() if len(c) and c.vals[-1] >= caution_highs[m] - 10]
+caution_sweep = exceedance.sweep_table(
+    {m: anomaly_curves[m] for m in near_caution},
+    {m: caution_highs[m] + limit_offsets for m in near_caution},
+    columns=[f"CH{offset:+g}" for offset in limit_offsets],
+)
+caution_sweep
+
+
 # In[45]:
 
 
-warning_limit_violations.to_csv('C:/Users/christian.anderson/Documents/Anomalies/2023/2023_44_Safe_Mode/max_min_data/WARNING_LIMIT_VIOLATIONS_v3.csv')
-caution_limit_violations.to_csv('C:/Users/christian.anderson/Documents/Anomalies/2023/2023_44_Safe_Mode/max_min_data/CAUTION_LIMIT_VIOLATIONS_v3.csv')
+unit_conversion.normalize_table(warning_limit_violations, ['Max Temp', 'Warning High'], report_unit)
+unit_conversion.normalize_table(caution_limit_violations, ['Max Temp', 'Caution High'], report_unit)
+
+with pipeline_stats.stage("write"):
+    warning_limit_violations.to_csv('C:/Users/christian.anderson/Documents/Anomalies/2023/2023_44_Safe_Mode/max_min_data/WARNING_LIMIT_VIOLATIONS_v3.csv')
+    caution_limit_violations.to_csv('C:/Users/christian.anderson/Documents/Anomalies/2023/2023_44_Safe_Mode/max_min_data/CAUTION_LIMIT_VIOLATIONS_v3.csv')
 
 
 # #### Caution Limit Violation Table: 
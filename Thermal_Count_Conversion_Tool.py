@@ -13,6 +13,12 @@ import numpy as np
 import plotly.io as pio
 import plotly.express as px
 from cheta import fetch_eng
+import telem_series
+import chandra_time_utils
+import msid_group_align
+import msid_catalog
+import plot_payloads
+import unit_conversion
 
 
 # In[2]:
@@ -37,118 +43,76 @@ pio.renderers.default = "notebook"
 
 
 def CtoF(cs):
-    try:
-        return np.array([c * 1.8 + 32 for c in cs])
-    except TypeError:
-        return cs * 1.8 + 32
+    # Scalars or whole arrays; see unit_conversion for tables and K
+    return unit_conversion.convert(cs, "DEGC", "DEGF")
 
 
 def FtoC(cs):
-    try:
-        return np.array([(c - 32) / 1.8 for c in cs])
-    except TypeError:
-        return (cs - 32) / 1.8
+    return unit_conversion.convert(cs, "DEGF", "DEGC")
 
 
 def maude_query(msid, t1, t2, all_points=True):
-    # (base URL)/<CHANNEL>/<querytype>.<format>?<query options separated by &>
-    # https://occweb.cfa.harvard.edu/maude/mrest/FLIGHT/msid.json?m=STAT_1DAY_MIN_OOBTHR18&ts=2015.001&tp=2016.001
-
-    # All Points
-    if all_points is True:
-        # All Points
-        base_url_constructor = "https://occweb.cfa.harvard.edu/maude/mrest/FLIGHT/msid.json?m={}&ts={}&tp={}&ap=t"
-    else:
-        # Reduced Points
-        base_url_constructor = "https://occweb.cfa.harvard.edu/maude/mrest/FLIGHT/msid.json?m={}&ts={}&tp={}"
-
-    url = base_url_constructor.format(msid.lower(), t1, t2)
-
-    try:
-        jsondata = requests.get(url).json()
-        data = pd.DataFrame(
-            {
-                "date": pd.to_datetime(jsondata["data-fmt-1"]["times"], format="%Y%j%H%M%S%f"),
-                "data": jsondata["data-fmt-1"]["values"],
-            }
-        )
-        data["data"] = pd.to_numeric(data["data"])
-    except:
-        data = pd.DataFrame(
-            {
-                "date": [
-                    None,
-                ],
-                "data": [
-                    None,
-                ],
-            }
-        )
-
-    return data
+    # MAUDE data as a "date"/"data" DataFrame; no data gives an empty (typed) frame.
+    # Use telem_series.maude_series() directly to keep the numpy arrays.
+    return telem_series.maude_series(msid, t1, t2, all_points=all_points).to_pandas()
 
 
 def ska_query(msid, t1, t2, stat="5min"):
-    data = fetch_eng.Msid(msid, t2, t2, stat=stat)
-    return pd.DataFrame({"date": data.times, "data": data.vals})
+    return telem_series.ska_series(msid, t1, t2, stat=stat).to_pandas(dates=False)
 
 
-def gen_plot_data(msid, fill_color, line_color, group):
+# The gen_*_plot_data traces send x as ms since 1970 (plot_payloads): the figure layout needs
+# "xaxis": {"type": "date"} (as in hrma_layout below), otherwise the axis shows raw numbers
+def gen_plot_data(msid, fill_color, line_color, group, resolution=None):
     min_msid = "STAT_1DAY_MIN_" + msid
     max_msid = "STAT_1DAY_MAX_" + msid
 
-    return {
-        "type": "scattergl",
-        "x": pd.concat([maude_data[min_msid]["date"], maude_data[max_msid]["date"][::-1]], axis=0),
-        "y": maude_data[min_msid]["data"] + maude_data[max_msid]["data"][::-1],
-        "name": msid,
-        "fill": "toself",
-        "fill_color": fill_color,
-        "line_color": line_color,
-        "legendgroup": group,
-    }
-
-
-def gen_min_plot_data(msid, line_color, group):
+    # Min forward / max backward fill band built in numpy, sent as typed arrays
+    return plot_payloads.envelope_trace(
+        maude_data[min_msid]["date"].values,
+        maude_data[min_msid]["data"].values,
+        maude_data[max_msid]["date"].values,
+        maude_data[max_msid]["data"].values,
+        name=msid,
+        fillcolor=fill_color,
+        line_color=line_color,
+        group=group,
+        resolution=resolution,
+    )
+
+
+def gen_min_plot_data(msid, line_color, group, regions, resolution=None):
+    # regions: one heater_regions.HeaterRegions for the whole plotted list, e.g.
+    # heater_regions.classify_range(msids, t1, t2), so groups and legend entries are shared
     min_msid = "STAT_1DAY_MIN_" + msid
-    print(np.median(maude_data[min_msid]["data"]))
-
-    showlegend = True if maude_data[min_msid]["data"][0] < 55 else False
-    if np.abs((np.median(maude_data[min_msid]["data"])) - 50) < 5:
-        group = "Heaters: 50F"
-        title = "Regions set to 50F"
-        color = line_color
-
-    elif np.median(maude_data[min_msid]["data"]) < 45:
-        group = "Cold Regions"
-        title = "Cold Regions"
-        color = "rgba(0, 0, 200, 0.5)"
-    else:
-        color = line_color
-        group = "Warm Regions"
-        title = "Warm Regions"
-
-    return {
-        "type": "scatter",
-        "x": maude_data[min_msid]["date"],
-        "y": maude_data[min_msid]["data"],
-        "name": msid,
-        "line_color": color,
-        "legendgroup": group,
-        "showlegend": showlegend,
-    }
-
-
-def gen_full_plot_data(msid, line_color, group, showlegend):
-    return {
-        "type": "scattergl",
-        "x": maude_data[msid]["date"],
-        "y": maude_data[msid]["data"],
-        "name": msid,
-        "line_color": line_color,
-        "legendgroup": group,
-        "showlegend": showlegend,
-    }
+
+    group = regions.group(msid) or "Warm Regions"
+    color = "rgba(0, 0, 200, 0.5)" if group == "Cold Regions" else line_color
+    # One legend entry per group
+    showlegend = regions.first_in_group(msid)
+
+    return plot_payloads.line_trace(
+        maude_data[min_msid]["date"].values,
+        maude_data[min_msid]["data"].values,
+        name=msid,
+        line_color=color,
+        group=group,
+        showlegend=showlegend,
+        resolution=resolution,
+        trace_type="scatter",
+    )
+
+
+def gen_full_plot_data(msid, line_color, group, showlegend, resolution=None):
+    return plot_payloads.line_trace(
+        maude_data[msid]["date"].values,
+        maude_data[msid]["data"].values,
+        name=msid,
+        line_color=line_color,
+        group=group,
+        showlegend=showlegend,
+        resolution=resolution,
+    )
 
 
 def hex_to_rgba(hexstr, opacity):
@@ -183,6 +147,7 @@ colors = px.colors.qualitative.D3
 
 
 tdb_poly_cal = pd.read_csv('C:/Users/christian.anderson/Documents/TDB_POLY_CAL.csv')
+msid_meta = msid_catalog.get()
 
 
 # In[5]:
@@ -248,8 +213,9 @@ def convert_to_temp(msid):
     t1 = "2022:296:00:00:00.000"
     t2 = "2022:298:00:00:00.000"
 
-    ska_data = fetch_eng.Msid(msid, t1, t2)
-    coef = ska_data.tdb.Tpc[ska_data.tdb.Tpc["CALIBRATION_SET_NUM"] == 1]
+    # Coefficients (calibration set 1) straight from TDB_POLY_CAL, no telemetry fetch needed
+    coef = tdb_poly_cal[(tdb_poly_cal["MSID"] == msid) & (tdb_poly_cal["CALIBRATION_SET_NUM"] == 1)]
+    coef = coef.reset_index(drop=True)
 
     # Get Counts
     maude_data = maude_query("RAW_" + msid, t1, t2)
@@ -260,12 +226,9 @@ def convert_to_temp(msid):
     print("converting...")
     print( )
 
-    # Find Degree of the polynomial from TDB_tpc
-    for i in range(len(tdb_poly_cal)):
-        if tdb_poly_cal.at[i, 'MSID'] == msid:
-            deg = tdb_poly_cal.at[i, 'DEG']
+    # Degree of the polynomial from the MSID catalog
+    deg = msid_meta.get(msid)["degree"]
 
-        
     temp_val = calc_poly(maude_data["data"].values, coef, deg)
     print("Temperature Values:")
     print(temp_val)
@@ -409,69 +372,108 @@ hrma = [
 
 t1 = "2022:296:00:00:00.000"
 t2 = "2022:298:00:00:00.000"
+hrma_series = {}
 maude_data = {}
 for msid2 in hrma:
-    maude_data[msid2] = maude_query("RAW_" + msid2, t1, t2)
+    hrma_series[msid2] = telem_series.maude_series("RAW_" + msid2, t1, t2)
+    maude_data[msid2] = hrma_series[msid2].to_pandas()
 
 
 # In[16]:
 
 
-plot_object = {
-    "data": [gen_full_plot_data(msid2, "rgba(50, 50, 0, 0.3)", msid2, showlegend=True) for msid2 in hrma],
-    "layout": {
-        "hovermode": "closest",
-        "autosize": False,
-        "width": 1900,
-        "height": 700,
-        "yaxis": {
-            "title": {"text": "Counts", "font": y_label_format},
-            "domain": [0.01, 0.99],
-            "position": 0.01,
-            "automargin": True,
-            "range": [0, 1050],
-            "tickfont": axis_format,
-        },
-        "xaxis": {"tickformatstops": time_axis_format, "domain": [0.02, 0.98], "position": 0, "tickfont": axis_format},
-        "title": {
-            "text": "HRMA Trends",
-            "font": title_format,
-            "y": 0.9,
-            "x": 0.5,
-            "xanchor": "center",
-            "yanchor": "top",
-        },
-        "legend": {
-            "x": 1.05,
-            "y": 0.12,
-            "font": {"family": "sans-serif", "size": 12, "color": "black"},
-        },
-        "template": "none",
-        "annotations": None,
-        "shapes": None,
+# Typed-array traces, decimated to `resolution` min/max points; the finished figure is cached by
+# (MSIDs in order, range, resolution, layout hash), so re-running the cell does not rebuild it
+# but editing hrma_layout does
+hrma_layout = {
+    "hovermode": "closest",
+    "autosize": False,
+    "width": 1900,
+    "height": 700,
+    "yaxis": {
+        "title": {"text": "Counts", "font": y_label_format},
+        "domain": [0.01, 0.99],
+        "position": 0.01,
+        "automargin": True,
+        "range": [0, 1050],
+        "tickfont": axis_format,
+    },
+    "xaxis": {
+        "type": "date",  # x is sent as ms since 1970
+        "tickformatstops": time_axis_format,
+        "domain": [0.02, 0.98],
+        "position": 0,
+        "tickfont": axis_format,
     },
-    "font": {"size": 32, "color": "#7f7f7f"},
+    "title": {
+        "text": "HRMA Trends",
+        "font": title_format,
+        "y": 0.9,
+        "x": 0.5,
+        "xanchor": "center",
+        "yanchor": "top",
+    },
+    "legend": {
+        "x": 1.05,
+        "y": 0.12,
+        "font": {"family": "sans-serif", "size": 12, "color": "black"},
+    },
+    "template": "none",
+    "annotations": None,
+    "shapes": None,
 }
 
 
-pio.show(plot_object)
+def build_hrma_plot(series, resolution):
+    # series: {msid: TelemSeries} already fetched for the cached range (hrma_series, t1..t2 above)
+    traces = [
+        plot_payloads.line_trace(
+            s.times,
+            s.vals,
+            name=msid2,
+            line_color="rgba(50, 50, 0, 0.3)",
+            group=msid2,
+            resolution=resolution,
+        )
+        for msid2, s in series.items()
+    ]
+    return {"data": traces, "layout": hrma_layout, "font": {"size": 32, "color": "#7f7f7f"}}
 
 
-# In[ ]:
-
+plot_object = plot_payloads.figure_cache.get_or_build(
+    hrma,
+    t1,
+    t2,
+    2000,
+    lambda msids, t1, t2, resolution: build_hrma_plot({m: hrma_series[m] for m in msids}, resolution),
+    version=plot_payloads.spec_hash(hrma_layout),
+)
+pio.show(plot_object)
 
-min_count = []
-max_count = []
 
-for msid2 in hrma:
-    min_count.append(maude_data2[msid2]["data"].min())
-    max_count.append(maude_data2[msid2]["data"].max())
-    
-min_c = min(min_count)
+# In[ ]:
 
-max_c = max(max_count)
 
-print("Observed count range is:", max_c - min_c)
+# Put the six struts on one time grid so group stats are single array reductions
+hrma_group = msid_group_align.align([s for s in hrma_series.values() if len(s)], method="previous", max_gap=300)
+
+# Observed range from every raw sample, not just the shared grid points
+raw_counts = [s.vals for s in hrma_series.values() if len(s)]
+if raw_counts:
+    min_c = min(vals.min() for vals in raw_counts)
+    max_c = max(vals.max() for vals in raw_counts)
+    print("Observed count range is:", max_c - min_c)
+else:
+    print("No HRMA strut data between", t1, "and", t2)
+
+# Sensor-to-sensor spread at each time step (strut heater failures show up here first)
+spread = hrma_group.spread() if len(hrma_group.times) else np.empty(0)
+if np.any(np.isfinite(spread)):
+    i_max = np.nanargmax(spread)
+    t_max = chandra_time_utils.secs2date(hrma_group.times[i_max])
+    print("Max strut-to-strut spread is:", spread[i_max], "counts at", t_max)
+else:
+    print("No overlapping HRMA strut samples to compare")
 
 
 # In[ ]:
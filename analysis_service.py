@@ -0,0 +1,423 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Long-lived local analysis service. Loads the calibration tables, limit index and MSID catalog
+# once, keeps recently fetched series in a memory-bounded LRU, and answers conversion, extremes,
+# violation-span and plot-data queries over local HTTP (JSON), so repeat questions during an
+# anomaly do not start from a cold notebook.
+#
+#     python analysis_service.py --port 8765 --cache-mb 2048
+#
+#     GET /convert?msid=4HLL2BT&counts=1200,1300            engineering values for raw counts
+#     GET /limits?msid=TSSMIN                               current caution/warning limits
+#     GET /extremes?msid=TSSMIN&t1=2023:044&t2=2023:055      max/min and their times (good samples)
+#     GET /violations?msid=TSSMIN&t1=...&t2=...&limit=caution_high
+#     GET /plot?msid=TSSMIN&t1=...&t2=...&resolution=2000     plotly trace (typed arrays) + layout
+#                                                           ({"xaxis": {"type": "date"}}: x is ms since 1970)
+#     GET /stats                                            cache size / hits, pipeline_stats summary
+#
+# From a notebook: analysis_service.query("extremes", msid="TSSMIN", t1="2023:044", t2="2023:055").
+#
+# Good samples follow the anomaly notebook: outside the event_windows.get_events windows for the
+# queried range (detected safe mode transitions, plus the 2023:044 manual windows with
+# --anomaly-2023-044) and below MAX_VALID.
+#
+# Requests are handled on threads, at most max_workers at a time. Concurrent requests for the
+# same series share one fetch, and a cached series also answers any sub-range of itself. Failed
+# MAUDE queries are errors (HTTP 500) and are not cached; ranges reaching the present expire after
+# a minute so live queries see new telemetry.
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import requests
+
+import bulk_conversion
+import chandra_time_utils
+import event_windows
+import msid_catalog
+import pipeline_stats
+import plot_payloads
+import telem_series
+import thermal_limits
+
+TDB_LIMIT_CSV = "C:/Users/christian.anderson/Documents/TDB_LIMIT.csv"
+
+DEFAULT_PORT = 8765
+
+# Same sanity cut as the anomaly notebook
+MAX_VALID = 250
+
+
+class SeriesCache:
+    # LRU of TelemSeries bounded by the bytes of their times/vals arrays and by item count.
+    # Failed fetches raise and are never cached. A range reaching within live_window seconds of
+    # now is only kept for live_ttl seconds, so live queries pick up new samples.
+
+    def __init__(self, max_bytes=1 << 30, max_items=4096, live_window=600.0, live_ttl=60.0):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.live_window = live_window
+        self.live_ttl = live_ttl
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # (msid, source, t1, t2) -> (TelemSeries, expiry time.monotonic() or None)
+        self._by_msid = {}  # (msid, source) -> set of keys, so lookups do not scan every item
+        self._inflight = {}  # key -> Future, so concurrent requests share one fetch
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(series):
+        return series.times.nbytes + series.vals.nbytes
+
+    def _covering(self, msid, source, t1, t2):
+        # A live (unexpired) cached series of the same MSID whose range contains t1..t2
+        now = time.monotonic()
+        for key in list(self._by_msid.get((msid, source), ())):
+            series, expiry = self._items[key]
+            if expiry is not None and now > expiry:
+                self._drop(key)
+                continue
+            if key[2] <= t1 and t2 <= key[3]:
+                return key, series
+        return None, None
+
+    def get(self, msid, source, t1, t2, fetch):
+        # fetch() -> TelemSeries, only called when nothing cached covers t1..t2; its exceptions
+        # propagate to every caller waiting on the same key
+        key = (msid, source, t1, t2)
+        with self._lock:
+            hit_key, series = self._covering(msid, source, t1, t2)
+            if series is not None:
+                self._items.move_to_end(hit_key)
+                self.hits += 1
+                pipeline_stats.count("service", msid, cache_hits=1)
+                if hit_key != key:
+                    i1 = np.searchsorted(series.times, t1, side="left")
+                    i2 = np.searchsorted(series.times, t2, side="right")
+                    series = series.select(slice(i1, i2))
+                return series
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            series = fetch()
+        except Exception as err:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(err)
+            raise
+
+        with self._lock:
+            del self._inflight[key]
+            self._put(key, series)
+        future.set_result(series)
+        return series
+
+    def _drop(self, key):
+        series, _ = self._items.pop(key)
+        self.nbytes -= self._size(series)
+        keys = self._by_msid[key[:2]]
+        keys.discard(key)
+        if not keys:
+            del self._by_msid[key[:2]]
+
+    def _put(self, key, series):
+        size = self._size(series)
+        if size > self.max_bytes:
+            return
+        if key in self._items:
+            self._drop(key)
+        live = key[3] >= _now_secs() - self.live_window
+        self._items[key] = (series, time.monotonic() + self.live_ttl if live else None)
+        self._by_msid.setdefault(key[:2], set()).add(key)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes or len(self._items) > self.max_items:
+            self._drop(next(iter(self._items)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "items": len(self._items),
+                "max_items": self.max_items,
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def _now_secs():
+    return float(chandra_time_utils.datetime642secs(np.datetime64(int(time.time() * 1e6), "us")))
+
+
+def _secs(t):
+    return chandra_time_utils.date2secs_cached(t) if isinstance(t, str) else float(t)
+
+
+def _spans(times, bools):
+    # Contiguous runs of True -> (starts, stops) in time, like pylimmon.find_violation_time_spans
+    if not np.any(bools):
+        return np.empty(0), np.empty(0)
+    edges = np.diff(np.concatenate(([False], bools, [False])).astype(np.int8))
+    return times[np.flatnonzero(edges == 1)], times[np.flatnonzero(edges == -1) - 1]
+
+
+class AnalysisService:
+    def __init__(
+        self,
+        tdb_limit_csv=TDB_LIMIT_CSV,
+        poly_csv=bulk_conversion.TDB_POLY_CAL_CSV,
+        point_pair_csv=bulk_conversion.TDB_POINT_PAIR_CSV,
+        catalog_path=msid_catalog.CATALOG_FILE,
+        max_cache_bytes=1 << 30,
+        url_template=telem_series.MAUDE_URL,
+        manual_events=None,
+        max_cache_items=4096,
+        event_sources=event_windows.DEFAULT_SOURCES,
+    ):
+        # Everything a cold notebook reloads per session, loaded once here. Missing tables leave
+        # the matching query unavailable instead of stopping the service.
+        self.cals = bulk_conversion.load_calibrations(poly_csv, point_pair_csv) if os.path.exists(poly_csv) else {}
+        self.tdb_limits = self._limit_index(tdb_limit_csv)
+        self.catalog = msid_catalog.load(catalog_path) if os.path.exists(catalog_path) else None
+        self.url_template = url_template
+        # Detected events (safe mode transitions, ...) plus these hand-typed rows, as in the notebooks
+        self.event_sources = event_sources
+        self.manual_events = manual_events
+        self.cache = SeriesCache(max_cache_bytes, max_items=max_cache_items)
+        self._limits = {}
+        self._limits_lock = threading.Lock()
+        self._events = {}
+        self._events_lock = threading.Lock()
+
+    @staticmethod
+    def _limit_index(path):
+        if not os.path.exists(path):
+            return None
+        table = pd.read_csv(path)
+        table["MSID"] = table["MSID"].astype(str).str.strip().str.upper()
+        return table.drop_duplicates("MSID", keep="last").set_index("MSID")
+
+    def series(self, msid, t1, t2, source="maude", stat="5min"):
+        msid = msid.upper()
+        t1, t2 = _secs(t1), _secs(t2)
+
+        def fetch():
+            d1, d2 = chandra_time_utils.secs2date(np.array([t1, t2]))
+            if source == "maude":
+                # Raise on failure so a MAUDE outage is an error, not a cached "no data"
+                return telem_series.maude_series(msid, d1, d2, url_template=self.url_template, raise_errors=True)
+            return telem_series.ska_series(msid, d1, d2, stat=stat)
+
+        return self.cache.get(msid, source if source == "maude" else f"{source}:{stat}", t1, t2, fetch)
+
+    def events(self, t1, t2):
+        # Event table for t1..t2 from event_windows.get_events (on-disk cache), kept in memory too
+        key = (_secs(t1), _secs(t2))
+        with self._events_lock:
+            if key in self._events:
+                return self._events[key]
+        events = event_windows.get_events(*key, sources=self.event_sources, manual=self.manual_events)
+        with self._events_lock:
+            self._events[key] = events
+        return events
+
+    def good_series(self, msid, t1, t2, source="maude"):
+        # Same good-sample rule as the anomaly notebook: outside every event window, below the sanity cut
+        series = self.series(msid, t1, t2, source=source)
+        good = event_windows.good_mask(series.times, self.events(t1, t2)) & (series.vals < MAX_VALID)
+        return series.select(good)
+
+    def convert(self, msid, counts):
+        cal = self.cals.get(msid.upper())
+        if cal is None:
+            # ValueError, not KeyError: the handler reports LookupErrors as an unknown endpoint
+            raise ValueError(f"No calibration for {msid}")
+        return bulk_conversion.convert(counts, cal)
+
+    def limits(self, msid):
+        msid = msid.upper()
+        with self._limits_lock:
+            if msid in self._limits:
+                return self._limits[msid]
+        try:
+            limits = thermal_limits.get_current_limits(msid)
+        except ImportError:
+            # No pylimmon on this machine: TDB_LIMIT export, then placeholders
+            if self.tdb_limits is not None and msid in self.tdb_limits.index:
+                row = self.tdb_limits.loc[msid]
+                limits = dict(thermal_limits.NO_LIMITS, source="tdb_csv")
+                limits.update({n: row[n.upper()] for n in thermal_limits.LIMIT_NAMES if n.upper() in row})
+            else:
+                limits = dict(thermal_limits.NO_LIMITS, source=None)
+        with self._limits_lock:
+            self._limits[msid] = limits
+        return limits
+
+    def extremes(self, msid, t1, t2, source="maude"):
+        series = self.good_series(msid, t1, t2, source=source)
+        if not len(series):
+            return {"msid": msid.upper(), "samples": 0}
+        i_max, i_min = np.argmax(series.vals), np.argmin(series.vals)
+        return {
+            "msid": msid.upper(),
+            "samples": len(series),
+            "max": series.vals[i_max],
+            "time_of_max": chandra_time_utils.secs2date(series.times[i_max]),
+            "min": series.vals[i_min],
+            "time_of_min": chandra_time_utils.secs2date(series.times[i_min]),
+            "unit": self.catalog.unit(msid) if self.catalog is not None else series.unit,
+        }
+
+    def violations(self, msid, t1, t2, limit="caution_high", source="maude"):
+        if limit not in thermal_limits.LIMIT_NAMES:
+            raise ValueError(f"limit must be one of {thermal_limits.LIMIT_NAMES}")
+        value = self.limits(msid)[limit]
+        series = self.good_series(msid, t1, t2, source=source)
+        bools = series.vals > value if limit.endswith("high") else series.vals < value
+        starts, stops = _spans(series.times, bools)
+        return {
+            "msid": msid.upper(),
+            "limit": limit,
+            "value": value,
+            "hours": float(np.sum(stops - starts)) / 3600.0,
+            "spans": [[a, b] for a, b in zip(chandra_time_utils.secs2date(starts), chandra_time_utils.secs2date(stops))],
+        }
+
+    def plot(self, msid, t1, t2, resolution=2000, source="maude"):
+        # x goes out as ms since 1970, so the layout to plot it with says the x axis is a date axis
+        series = self.series(msid, t1, t2, source=source)
+        return {
+            "trace": plot_payloads.line_trace(series.times, series.vals, name=msid.upper(), resolution=resolution),
+            "layout": {"xaxis": {"type": "date"}},
+        }
+
+    def stats(self):
+        return {"cache": self.cache.stats(), "pipeline": pipeline_stats.records()}
+
+    # --- HTTP ---
+
+    def handle(self, endpoint, params):
+        def get(name, default=None):
+            return params.get(name, [default])[0]
+
+        source = get("source", "maude")
+        if endpoint == "convert":
+            counts = np.array(get("counts", "").split(","), dtype=np.float64)
+            return {"msid": get("msid").upper(), "vals": self.convert(get("msid"), counts)}
+        if endpoint == "limits":
+            return self.limits(get("msid"))
+        if endpoint == "extremes":
+            return self.extremes(get("msid"), get("t1"), get("t2"), source=source)
+        if endpoint == "violations":
+            return self.violations(get("msid"), get("t1"), get("t2"), get("limit", "caution_high"), source=source)
+        if endpoint == "plot":
+            return self.plot(get("msid"), get("t1"), get("t2"), int(get("resolution", 2000)), source=source)
+        if endpoint == "stats":
+            return self.stats()
+        raise LookupError(endpoint)
+
+    def serve(self, host="127.0.0.1", port=DEFAULT_PORT, max_workers=8):
+        # -> ThreadingHTTPServer; call .serve_forever() (or run it in a thread) and .shutdown()
+        service = self
+        slots = threading.BoundedSemaphore(max_workers)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                t0 = time.perf_counter()
+                with slots:
+                    try:
+                        status, payload = 200, service.handle(url.path.strip("/"), parse_qs(url.query))
+                    except LookupError as err:
+                        status, payload = 404, {"error": f"not found: {err}"}
+                    except (TypeError, ValueError, AttributeError) as err:
+                        status, payload = 400, {"error": repr(err)}
+                    except Exception as err:
+                        status, payload = 500, {"error": repr(err)}
+                body = json.dumps(payload, default=_jsonable).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("X-Elapsed-Ms", f"{1000 * (time.perf_counter() - t0):.1f}")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        return server
+
+
+def _jsonable(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def query(endpoint, base_url=f"http://127.0.0.1:{DEFAULT_PORT}", **params):
+    # Client side, e.g. query("violations", msid="TSSMIN", t1="2023:044", t2="2023:055")
+    resp = requests.get(f"{base_url}/{endpoint}", params=params)
+    payload = resp.json()
+    if resp.status_code != 200:
+        raise RuntimeError(payload.get("error", resp.status_code))
+    return payload
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Local thermal analysis service with warm caches")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--cache-mb", type=float, default=1024, help="Memory bound for cached telemetry")
+    parser.add_argument("--cache-items", type=int, default=4096, help="Most series kept in the cache")
+    parser.add_argument("--workers", type=int, default=8, help="Requests handled at the same time")
+    parser.add_argument("--tdb-limit", default=TDB_LIMIT_CSV, help="TDB_LIMIT.csv")
+    parser.add_argument("--poly-cal", default=bulk_conversion.TDB_POLY_CAL_CSV, help="TDB_POLY_CAL.csv")
+    parser.add_argument("--point-pair", default=bulk_conversion.TDB_POINT_PAIR_CSV, help="TDB_POINT_PAIR.csv")
+    parser.add_argument("--catalog", default=msid_catalog.CATALOG_FILE, help="Pickled msid_catalog")
+    parser.add_argument(
+        "--anomaly-2023-044", action="store_true", help="Also exclude the 2023:044 manual event windows"
+    )
+    opt = parser.parse_args(args)
+
+    manual = event_windows.ANOMALY_2023_044_MANUAL if opt.anomaly_2023_044 else None
+    service = AnalysisService(
+        opt.tdb_limit,
+        opt.poly_cal,
+        opt.point_pair,
+        opt.catalog,
+        max_cache_bytes=int(opt.cache_mb * 2**20),
+        manual_events=manual,
+        max_cache_items=opt.cache_items,
+    )
+    server = service.serve(opt.host, opt.port, max_workers=opt.workers)
+    print(f"Serving on http://{opt.host}:{server.server_port} ({len(service.cals)} calibrations loaded)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
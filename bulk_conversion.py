@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Bulk raw-count -> engineering-unit conversion for every MSID in TDB_POLY_CAL and
+# TDB_POINT_PAIR.
+#
+# Raw counts (RAW_<msid>) are fetched from MAUDE in time chunks, converted with the MSID's
+# polynomial or point-pair calibration, and written to a columnar store:
+#
+#     <out_dir>/<MSID>/<chunk start YYYYDOYhhmmss>.parquet   columns: times (CXC secs), counts, vals
+#
+# MSIDs are spread over worker processes; progress is reported per MSID, data is never printed.
+# A failed MAUDE chunk fails its MSID (Error column in the summary); chunks that came back with
+# no samples are counted in the Empty Chunks column.
+#
+#     python bulk_conversion.py 2022:296 2022:298 --out converted --processes 8
+#     python bulk_conversion.py 2022:296 2022:298 --msids 4HLL2BT TMZP_CNT
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import chandra_time_utils
+import telem_series
+
+TDB_POLY_CAL_CSV = "C:/Users/christian.anderson/Documents/TDB_POLY_CAL.csv"
+TDB_POINT_PAIR_CSV = "C:/Users/christian.anderson/Documents/TDB_POINT_PAIR.csv"
+
+CHUNK_DAYS = 30
+
+
+def load_calibrations(poly_csv=TDB_POLY_CAL_CSV, point_pair_csv=TDB_POINT_PAIR_CSV, calibration_set=1):
+    # {msid: ("poly", coefs low -> high order)} and {msid: ("point_pair", (raw counts, eng values))},
+    # built with one pass over each table
+    cals = {}
+
+    poly = pd.read_csv(poly_csv)
+    if "CALIBRATION_SET_NUM" in poly:
+        poly = poly[poly["CALIBRATION_SET_NUM"] == calibration_set]
+    coef_cols = sorted((c for c in poly.columns if c.startswith("COEF")), key=lambda c: int(c[4:]))
+    coefs = poly[coef_cols].fillna(0.0).to_numpy(dtype=np.float64)
+    for msid, deg, row in zip(poly["MSID"], poly["DEG"], coefs):
+        cals[msid.strip().upper()] = ("poly", row[: int(deg) + 1])
+
+    pairs = pd.read_csv(point_pair_csv)
+    if "CALIBRATION_SET_NUM" in pairs:
+        pairs = pairs[pairs["CALIBRATION_SET_NUM"] == calibration_set]
+    pairs = pairs.sort_values(["MSID", "SEQUENCE_NUM"])
+    for msid, group in pairs.groupby("MSID", sort=False):
+        rc = group["RAW_COUNT"].to_numpy(dtype=np.float64)
+        euv = group["ENG_UNIT_VALUE"].to_numpy(dtype=np.float64)
+        cals[msid.strip().upper()] = ("point_pair", (rc, euv))
+
+    return cals
+
+
+def convert(counts, cal):
+    # Raw counts -> engineering units for one MSID, whole array at once
+    kind, params = cal
+    counts = np.asarray(counts, dtype=np.float64)
+    if kind == "poly":
+        return np.polynomial.polynomial.polyval(counts, params)
+    rc, euv = params
+    order = np.argsort(rc)  # np.interp needs increasing x
+    return np.interp(counts, rc[order], euv[order])
+
+
+def _write_chunk(path, times, counts, vals):
+    table = pd.DataFrame({"times": times, "counts": counts, "vals": vals.astype(np.float32)})
+    try:
+        table.to_parquet(path + ".parquet", index=False)
+    except ImportError:
+        # No pyarrow/fastparquet: same columns as a compressed npz
+        np.savez_compressed(path + ".npz", times=times, counts=counts, vals=vals.astype(np.float32))
+
+
+def convert_msid(msid, cal, t1, t2, out_dir, chunk_days=CHUNK_DAYS, url_template=telem_series.MAUDE_URL):
+    # Fetch RAW_<msid> in chunks, convert and store; returns (msid, n samples, seconds, empty chunk
+    # start dates). Raises on the first chunk MAUDE could not deliver.
+    t_start = time.monotonic()
+    msid_dir = os.path.join(out_dir, msid)
+    os.makedirs(msid_dir, exist_ok=True)
+
+    n_total = 0
+    empty_chunks = []
+    edges = np.arange(t1, t2, chunk_days * 86400.0).tolist() + [t2]
+    for c1, c2 in zip(edges[:-1], edges[1:]):
+        d1, d2 = chandra_time_utils.secs2date(np.array([c1, c2]))
+        try:
+            raw = telem_series.maude_series("RAW_" + msid, d1, d2, url_template=url_template, raise_errors=True)
+        except Exception as err:
+            raise RuntimeError(f"MAUDE fetch failed for {d1}..{d2}: {err!r}") from err
+        keep = (raw.times >= c1) & (raw.times < c2) if c2 != t2 else (raw.times >= c1)
+        if not np.any(keep):
+            empty_chunks.append(d1)
+            continue
+        counts = raw.vals[keep]
+        _write_chunk(os.path.join(msid_dir, d1[:17].replace(":", "")), raw.times[keep], counts, convert(counts, cal))
+        n_total += int(np.count_nonzero(keep))
+
+    return msid, n_total, time.monotonic() - t_start, empty_chunks
+
+
+def run(
+    t1,
+    t2,
+    out_dir,
+    msids=None,
+    cals=None,
+    processes=None,
+    chunk_days=CHUNK_DAYS,
+    url_template=telem_series.MAUDE_URL,
+    log=sys.stdout,
+):
+    # Convert every calibrated MSID (or just `msids`) over t1..t2 in `processes` worker processes
+    cals = load_calibrations() if cals is None else cals
+    t1 = chandra_time_utils.date2secs(t1) if isinstance(t1, str) else t1
+    t2 = chandra_time_utils.date2secs(t2) if isinstance(t2, str) else t2
+    msids = sorted(cals) if msids is None else [m.upper() for m in msids]
+
+    missing = [m for m in msids if m not in cals]
+    if missing:
+        print(f"No calibration for {len(missing)} MSIDs, skipping: {' '.join(missing)}", file=log)
+    msids = [m for m in msids if m in cals]
+
+    os.makedirs(out_dir, exist_ok=True)
+    results = []
+    t_start = time.monotonic()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {pool.submit(convert_msid, m, cals[m], t1, t2, out_dir, chunk_days, url_template): m for m in msids}
+        for i, future in enumerate(as_completed(futures), 1):
+            msid = futures[future]
+            try:
+                _, n, dt, empty = future.result()
+                results.append((msid, n, dt, len(empty), None))
+                note = f" ({len(empty)} empty chunks, first {empty[0]})" if empty else ""
+                print(f"[{i}/{len(msids)}] {msid}: {n} samples in {dt:.1f} s{note}", file=log)
+            except Exception as err:
+                results.append((msid, 0, 0.0, 0, repr(err)))
+                print(f"[{i}/{len(msids)}] {msid}: FAILED {err!r}", file=log)
+
+    print(f"Converted {len(msids)} MSIDs in {time.monotonic() - t_start:.1f} s", file=log)
+    failed = sum(r[-1] is not None for r in results)
+    if failed:
+        print(f"{failed} MSIDs FAILED, see the Error column", file=log)
+    return pd.DataFrame(results, columns=["MSID", "Samples", "Seconds", "Empty Chunks", "Error"])
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Convert raw counts to engineering units for all TDB-calibrated MSIDs")
+    parser.add_argument("start", help="Start time, YYYY:DOY[:hh:mm:ss]")
+    parser.add_argument("stop", help="Stop time, YYYY:DOY[:hh:mm:ss]")
+    parser.add_argument("--out", default="converted", help="Output directory")
+    parser.add_argument("--msids", nargs="*", help="Only these MSIDs (default: all in the calibration tables)")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-days", type=float, default=CHUNK_DAYS, help="Days of raw counts per MAUDE query")
+    parser.add_argument("--poly-cal", default=TDB_POLY_CAL_CSV, help="TDB_POLY_CAL.csv")
+    parser.add_argument("--point-pair", default=TDB_POINT_PAIR_CSV, help="TDB_POINT_PAIR.csv")
+    opt = parser.parse_args(args)
+
+    cals = load_calibrations(opt.poly_cal, opt.point_pair)
+    summary = run(
+        opt.start, opt.stop, opt.out, msids=opt.msids, cals=cals, processes=opt.processes, chunk_days=opt.chunk_days
+    )
+    summary.to_csv(os.path.join(opt.out, "summary.csv"), index=False)
+
+
+if __name__ == "__main__":
+    main()
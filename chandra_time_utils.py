@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Vectorized time conversions between CXC seconds, "YYYY:DOY:hh:mm:ss.sss" date strings,
+# MAUDE "YYYYDOYhhmmssfff" strings and numpy datetime64 (UTC).
+#
+# CXC seconds are TT seconds since 1998-01-01T00:00:00 TT, so going to UTC needs
+# TT-UTC = 32.184 + (TAI-UTC). Instead of calling CxoTime / Chandra.Time once per value,
+# everything here is numpy arithmetic on whole arrays plus a small leap second table.
+# Constant strings (event times, anomaly start/stop) go through date2secs_cached().
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import pipeline_stats
+
+# CXC seconds = 0 at 1997:365:23:58:56.816 UTC (TAI-UTC was 31 s)
+CXC_EPOCH_UTC = np.datetime64("1997-12-31T23:58:56.816", "ns")
+
+# UTC dates (00:00:00 right after the leap second) of leap seconds since the CXC epoch.
+# Add new entries here if IERS announces another one.
+LEAP_SECOND_DATES = np.array(
+    ["1999-01-01", "2006-01-01", "2009-01-01", "2012-07-01", "2015-07-01", "2017-01-01"],
+    dtype="datetime64[ns]",
+)
+
+# CXC seconds of each of those instants
+_LEAP_SECOND_SECS = (LEAP_SECOND_DATES - CXC_EPOCH_UTC) / np.timedelta64(1, "s") + np.arange(
+    1, len(LEAP_SECOND_DATES) + 1
+)
+
+DATE_FORMAT = "%Y:%j:%H:%M:%S.%f"
+MAUDE_FORMAT = "%Y%j%H%M%S%f"
+
+
+def secs2datetime64(secs):
+    # CXC seconds -> datetime64[ns] UTC (a time inside a leap second maps to the following 00:00:00)
+    secs = np.asarray(secs, dtype=np.float64)
+    n_leap = np.searchsorted(_LEAP_SECOND_SECS, secs, side="right")
+    # float64 CXC seconds resolve ~0.1 us, so round to whole microseconds
+    us = np.round((secs - n_leap) * 1e6).astype(np.int64)
+    return CXC_EPOCH_UTC + us.astype("timedelta64[us]")
+
+
+def datetime642secs(dt):
+    # datetime64 UTC -> CXC seconds (float64)
+    dt = np.asarray(dt, dtype="datetime64[ns]")
+    n_leap = np.searchsorted(LEAP_SECOND_DATES, dt, side="right")
+    return (dt - CXC_EPOCH_UTC) / np.timedelta64(1, "s") + n_leap
+
+
+def parse_dates(dates, fmt=DATE_FORMAT):
+    # Array of date strings -> datetime64[ns]. Accepts "YYYY:DOY" and "YYYY:DOY:hh:mm:ss" as well.
+    dates = np.atleast_1d(np.asarray(dates, dtype=str))
+    if fmt == DATE_FORMAT:
+        dates = _pad_date_strings(dates)
+    return pd.to_datetime(dates, format=fmt).values
+
+
+def _pad_date_strings(dates):
+    # "2023:044" / "2023:044:17:41:07" -> "2023:044:00:00:00.000" / "2023:044:17:41:07.000"
+    full = "0000:000:00:00:00.000"
+    lengths = np.char.str_len(dates)
+    if np.all(lengths == len(full)):
+        return dates
+    out = dates.copy().astype(f"<U{len(full)}")
+    for n in np.unique(lengths):
+        if n < len(full):
+            sel = lengths == n
+            out[sel] = np.char.add(dates[sel], full[n:])
+    return out
+
+
+def date2secs(dates):
+    # "YYYY:DOY:hh:mm:ss.sss" strings (scalar or array) -> CXC seconds
+    secs = datetime642secs(parse_dates(dates))
+    return secs[0] if np.ndim(dates) == 0 else secs
+
+
+@lru_cache(maxsize=4096)
+def _date2secs_cached(date):
+    return float(date2secs(date))
+
+
+def date2secs_cached(date):
+    # Scalar version for constant strings that are looked up again and again inside loops
+    hits = _date2secs_cached.cache_info().hits
+    secs = _date2secs_cached(date)
+    if _date2secs_cached.cache_info().hits > hits:
+        pipeline_stats.count("time", cache_hits=1)
+    return secs
+
+
+def maude2secs(times):
+    # MAUDE "YYYYDOYhhmmssfff" strings -> CXC seconds
+    return datetime642secs(parse_dates(times, fmt=MAUDE_FORMAT))
+
+
+def secs2date(secs):
+    # CXC seconds (scalar or array) -> "YYYY:DOY:hh:mm:ss.sss" strings
+    dates = format_dates(secs2datetime64(np.atleast_1d(secs)))
+    return dates[0] if np.ndim(secs) == 0 else dates
+
+
+def format_dates(dt):
+    # datetime64 -> "YYYY:DOY:hh:mm:ss.sss" strings, built from integer fields
+    # rather than per-element strftime.
+    dt = np.asarray(dt, dtype="datetime64[ms]")
+    if not dt.size:
+        return np.empty(dt.shape, dtype="<U21")
+    year = dt.astype("datetime64[Y]")
+    day = dt.astype("datetime64[D]")
+    doy = (day - year.astype("datetime64[D]")).astype(np.int64) + 1
+    ms = (dt - day).astype(np.int64)
+    hh, ms = np.divmod(ms, 3600000)
+    mm, ms = np.divmod(ms, 60000)
+    ss, ms = np.divmod(ms, 1000)
+
+    fields = [
+        (year.astype(np.int64) + 1970, 4, ":"),
+        (doy, 3, ":"),
+        (hh, 2, ":"),
+        (mm, 2, ":"),
+        (ss, 2, "."),
+        (ms, 3, ""),
+    ]
+    out = np.full(dt.shape, "", dtype="<U21")
+    for vals, width, sep in fields:
+        out = np.char.add(out, np.char.zfill(vals.astype(str), width))
+        if sep:
+            out = np.char.add(out, sep)
+    return out
+
+
+def parse_event_table(events):
+    # {name: date string} or [(name, date string), ...] -> {name: CXC seconds}, parsed in one call
+    items = list(events.items()) if isinstance(events, dict) else list(events)
+    names = [name for name, _ in items]
+    secs = date2secs(np.array([date for _, date in items]))
+    return dict(zip(names, secs.tolist()))
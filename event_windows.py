@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Exclusion windows (safe mode transitions, CTU swaps, thermal control disables, ...) detected
+# from state telemetry instead of typed in as CxoTime literals.
+#
+#     events = event_windows.get_events(t1, t2)                 # cached on disk by time range
+#     good = event_windows.good_mask(data.times, events) & (data.vals < 250)
+#
+# Each EventSource names a state MSID and the state values that count as "in the event".
+# "transition" sources give one window per entry into the state (start = stop = transition
+# time), "state" sources give one window per contiguous span in the state. The event table has
+# one row per window: name, msid, start, stop, pad (CXC secs); a sample is excluded when
+# start - pad <= t <= stop + pad, same as the old ind1/ind2 ... pairs.
+#
+# State MSIDs are fetched from t1 - max(pad) - FETCH_MARGIN to t2 + max(pad), so a transition
+# just before t1 (or before the first in-range sample) is still seen; every window whose padded
+# span overlaps t1..t2 is kept.
+
+import hashlib
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import chandra_time_utils
+import pipeline_stats
+
+CACHE_DIR = os.environ.get("THERMAL_CACHE", os.path.join(os.path.expanduser("~"), ".thermal_cache"))
+
+EventSource = namedtuple("EventSource", ["name", "msid", "states", "kind", "pad"])
+
+# OFP state goes NRML -> SAFE on every safe mode entry. Add sources here (e.g.
+# EventSource("NSUN transition", "AOPCADMD", ("NSUN",), "transition", 300), CTU side select,
+# thermal control enable) as the state MSIDs are confirmed; until then those windows come in
+# through `manual` (see ANOMALY_2023_044_MANUAL).
+DEFAULT_SOURCES = [
+    EventSource("Safe Mode transition", "CONLOFP", ("SAFE",), "transition", 300),
+]
+
+COLUMNS = ["name", "msid", "start", "stop", "pad"]
+
+# Extra lookback before t1 - pad, several state samples long, so the state before a transition
+# at the edge of the range is in the fetch
+FETCH_MARGIN = 600.0
+
+# Hand-typed safe mode entries from the original 2023:044 analysis; check_events() confirms the
+# CONLOFP detection reproduces them
+SAFE_MODE_TRANSITIONS = ["2022:293:16:27:49.000", "2023:044:17:41:07.000", "2023:047:07:33:47.000"]
+
+# Windows from the 2023:044 analysis that have no configured state source yet: (name, start, stop, pad)
+ANOMALY_2023_044_MANUAL = [
+    ("Swap to CTU-A", "2023:045:03:32:39.000", "2023:045:03:32:39.000", 300),
+    ("Swap to CTU-A", "2023:048:03:17:11.000", "2023:048:03:17:11.000", 300),
+    ("Thermal Control Disabled", "2023:045:03:29:49.010", "2023:045:04:48:37.150", 70),
+    ("Thermal Control Disabled", "2023:047:07:33:33.163", "2023:047:07:34:48.125", 70),
+    ("Thermal Control Disabled", "2023:048:03:14:30.531", "2023:048:03:56:31.086", 70),
+]
+
+
+def state_windows(times, vals, states, kind="transition"):
+    # (starts, stops) of the spans where vals is in `states`, from one vectorized pass
+    inside = np.isin(np.char.strip(np.asarray(vals, dtype=str)), states)
+    if not np.any(inside):
+        return np.empty(0), np.empty(0)
+    edges = np.diff(np.concatenate(([False], inside, [False])).astype(np.int8))
+    i_start = np.flatnonzero(edges == 1)
+    i_stop = np.flatnonzero(edges == -1) - 1
+    # A span already open at the start of the fetch is not a transition we saw
+    if kind == "transition":
+        keep = i_start > 0
+        return times[i_start[keep]], times[i_start[keep]]
+    return times[i_start], times[i_stop]
+
+
+def source_events(source, times, vals, t1, t2):
+    # Event table for one source from its state telemetry, keeping windows whose padded span
+    # overlaps t1..t2 (times/vals may extend past t1..t2)
+    starts, stops = state_windows(np.asarray(times), vals, source.states, kind=source.kind)
+    keep = (stops + source.pad >= t1) & (starts - source.pad <= t2)
+    return pd.DataFrame(
+        {"name": source.name, "msid": source.msid, "start": starts[keep], "stop": stops[keep], "pad": float(source.pad)},
+        columns=COLUMNS,
+    )
+
+
+def detect_events(t1, t2, sources=DEFAULT_SOURCES):
+    from cheta import fetch_eng
+
+    tables = []
+    for source in sources:
+        with pipeline_stats.stage("fetch", source.msid):
+            data = fetch_eng.Msid(source.msid, t1 - source.pad - FETCH_MARGIN, t2 + source.pad)
+        tables.append(source_events(source, data.times, data.vals, t1, t2))
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=COLUMNS)
+
+
+def check_events(events, t1, t2, expected=SAFE_MODE_TRANSITIONS, name="Safe Mode transition", tol=60.0):
+    # Expected event dates inside t1..t2 with no detected `name` event within tol seconds
+    # (empty list = all found)
+    t1 = chandra_time_utils.date2secs(t1) if isinstance(t1, str) else float(t1)
+    t2 = chandra_time_utils.date2secs(t2) if isinstance(t2, str) else float(t2)
+    detected = events.loc[events["name"] == name, "start"].to_numpy(dtype=np.float64)
+    secs = np.atleast_1d(chandra_time_utils.date2secs(np.array(expected)))
+    return [
+        date
+        for date, t in zip(expected, secs)
+        if t1 <= t <= t2 and not np.any(np.abs(detected - t) <= tol)
+    ]
+
+
+def manual_events(rows):
+    # [(name, start date, stop date, pad), ...] -> event table, all dates parsed in one call
+    if not rows:
+        return pd.DataFrame(columns=COLUMNS)
+    names, starts, stops, pads = zip(*rows)
+    secs = chandra_time_utils.date2secs(np.array(starts + stops))
+    return pd.DataFrame(
+        {"name": names, "msid": None, "start": secs[: len(rows)], "stop": secs[len(rows) :], "pad": np.array(pads, float)},
+        columns=COLUMNS,
+    )
+
+
+def _cache_file(t1, t2, sources, cache_dir):
+    # FETCH_MARGIN is part of the key: tables detected without the lookback are not reused
+    key = repr((round(t1, 3), round(t2, 3), [tuple(s) for s in sources], FETCH_MARGIN))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, "events", f"events_{digest}.csv")
+
+
+def get_events(t1, t2, sources=DEFAULT_SOURCES, manual=None, cache_dir=CACHE_DIR, refresh=False):
+    # Event table for t1..t2 (date strings or CXC secs). Detected events are cached per
+    # (time range, sources); `manual` rows are added on top and never cached.
+    t1 = chandra_time_utils.date2secs(t1) if isinstance(t1, str) else float(t1)
+    t2 = chandra_time_utils.date2secs(t2) if isinstance(t2, str) else float(t2)
+
+    path = _cache_file(t1, t2, sources, cache_dir)
+    if os.path.exists(path) and not refresh:
+        events = pd.read_csv(path)
+        pipeline_stats.count("events", cache_hits=1)
+    else:
+        events = detect_events(t1, t2, sources=sources)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        events.to_csv(path, index=False)
+
+    if manual:
+        events = pd.concat([events, manual_events(manual)], ignore_index=True)
+    return events.sort_values("start", ignore_index=True)
+
+
+def good_mask(times, events):
+    # True for samples outside every [start - pad, stop + pad] window. times must be sorted.
+    times = np.asarray(times)
+    if not len(events):
+        return np.ones(len(times), dtype=bool)
+    lo = np.searchsorted(times, events["start"].values - events["pad"].values, side="left")
+    hi = np.searchsorted(times, events["stop"].values + events["pad"].values, side="right")
+    depth = np.zeros(len(times) + 1, dtype=np.int64)
+    np.add.at(depth, lo, 1)
+    np.add.at(depth, hi, -1)
+    return np.cumsum(depth[:-1]) == 0
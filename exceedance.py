@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Exceedance curves: time spent above (or below) any number of candidate thresholds, for limit
+# change reviews. Each MSID's good samples are sorted by value once and weighted by the time
+# they represent; after that any threshold array is answered with one searchsorted.
+#
+#     curve = exceedance.ExceedanceCurve(data.times, data.vals, good)
+#     curve.hours_above([100, 105, 110, 115])
+#     exceedance.sweep_table(curves, np.arange(90, 130, 0.5))        # MSIDs x thresholds, hours above
+#
+# A sample stands for half the interval to each neighbour (midpoint rule). An interval longer
+# than max_gap (data dropout, or a window removed by the event mask) only counts max_gap, so a
+# sample on either side of a gap does not claim the whole gap.
+
+import numpy as np
+import pandas as pd
+
+import rate_of_change
+
+
+def sample_weights(times, max_gap=None):
+    # Seconds represented by each sample; times must be sorted
+    times = np.asarray(times, dtype=np.float64)
+    n = len(times)
+    if n < 2:
+        return np.zeros(n)
+    dt = np.diff(times)
+    if max_gap is None:
+        # Same gap definition as rate_of_change: 5x the median spacing
+        max_gap = rate_of_change.gap_threshold(times)
+    dt = np.minimum(dt, max_gap)
+    weights = np.empty(n)
+    weights[1:-1] = 0.5 * (dt[:-1] + dt[1:])
+    # The end samples only have one neighbour: its half interval is mirrored outward
+    weights[0] = dt[0]
+    weights[-1] = dt[-1]
+    return weights
+
+
+class ExceedanceCurve:
+    def __init__(self, times, vals, good=None, max_gap=None):
+        times = np.asarray(times, dtype=np.float64)
+        vals = np.asarray(vals, dtype=np.float64)
+        if good is not None:
+            times, vals = times[good], vals[good]
+        weights = sample_weights(times, max_gap=max_gap)
+
+        order = np.argsort(vals, kind="stable")
+        self.vals = vals[order]
+        # above[i] = seconds with value >= vals[i]; one extra 0 for thresholds above the max
+        self._above = np.concatenate((np.cumsum(weights[order][::-1])[::-1], [0.0]))
+        self.total = self._above[0] if len(vals) else 0.0
+
+    def __len__(self):
+        return len(self.vals)
+
+    def seconds_above(self, thresholds):
+        # Seconds with value > threshold, for a scalar or any array of thresholds
+        idx = np.searchsorted(self.vals, np.asarray(thresholds, dtype=np.float64), side="right")
+        return self._above[idx]
+
+    def seconds_below(self, thresholds):
+        # Seconds with value < threshold
+        idx = np.searchsorted(self.vals, np.asarray(thresholds, dtype=np.float64), side="left")
+        return self.total - self._above[idx]
+
+    def hours_above(self, thresholds):
+        return self.seconds_above(thresholds) / 3600.0
+
+    def hours_below(self, thresholds):
+        return self.seconds_below(thresholds) / 3600.0
+
+    def threshold_for(self, hours):
+        # Inverse curve: lowest threshold exceeded for at most `hours` (hours may be an array)
+        if not len(self.vals):
+            return np.full(np.shape(hours), np.nan)
+        secs = np.asarray(hours, dtype=np.float64) * 3600.0
+        # _above is non-increasing; flip it to search for the first sample with <= secs above it
+        idx = len(self._above) - np.searchsorted(self._above[::-1], secs, side="right")
+        return self.vals[np.clip(idx, 0, len(self.vals) - 1)]
+
+
+def curves(series, max_gap=None):
+    # {msid: (times, vals, good)} or {msid: (times, vals)} -> {msid: ExceedanceCurve}
+    return {msid: ExceedanceCurve(*args, max_gap=max_gap) for msid, args in series.items()}
+
+
+def sweep_table(curves, thresholds, below=False, columns=None):
+    # Hours above (or below) each threshold for a batch of MSIDs.
+    # thresholds: one array for every MSID -> columns are the thresholds, or {msid: array} of the
+    # same length (e.g. caution_high + offsets) -> columns are the positions 0..n-1.
+    # columns= labels the columns instead (kept when there are no MSIDs: an empty table, not 0x0).
+    if isinstance(thresholds, dict):
+        rows = {m: (c.hours_below if below else c.hours_above)(thresholds[m]) for m, c in curves.items()}
+    else:
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        rows = {m: (c.hours_below if below else c.hours_above)(thresholds) for m, c in curves.items()}
+        if columns is None:
+            columns = thresholds
+    table = pd.DataFrame.from_dict(rows, orient="index", columns=columns)
+    table.index.name = "MSID"
+    return table
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Heater-region classification for the whole thermal list at once, from the STAT_1DAY_MIN_
+# daily minimums. Same classes and thresholds as gen_min_plot_data (degF):
+#
+#     |median - 50| < 5   -> "Heaters: 50F"
+#     median < 45         -> "Cold Regions"
+#     otherwise           -> "Warm Regions"
+#
+# but the median is a rolling median over `window_days`, so every MSID gets a class per day and
+# a heater set point change shows up as a class change, and the robust spread (interquartile
+# range over the same window) comes out of the same pass.
+#
+#     regions = heater_regions.classify_range(num_msid, "2000:001", "2023:051")   # cached by range
+#     regions.group("OOBTHR05"), regions.changes(), regions.to_pandas()
+#
+# All MSIDs go on one daily grid (msid_group_align.resample), and the rolling statistics are
+# computed on (n_msids, n_days, window) blocks: one sort per block, medians/quartiles picked
+# with take_along_axis. No per-MSID np.median calls.
+
+import hashlib
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import chandra_time_utils
+import msid_group_align
+import telem_series
+
+CACHE_DIR = os.environ.get("THERMAL_CACHE", os.path.join(os.path.expanduser("~"), ".thermal_cache"))
+
+CLASSES = ("Heaters: 50F", "Cold Regions", "Warm Regions")
+HEATER, COLD, WARM = range(3)
+NO_DATA = -1
+
+HEATER_SET_POINT = 50.0
+HEATER_TOLERANCE = 5.0
+COLD_BELOW = 45.0
+
+DAY = 86400.0
+
+# MSIDs per block: keeps the (rows, days, window) array to ~100 MB for a mission at 30 days
+BLOCK_ROWS = 16
+
+
+def classify_values(medians):
+    # Class codes for an array of medians (NaN -> NO_DATA)
+    medians = np.asarray(medians, dtype=np.float64)
+    codes = np.full(medians.shape, WARM, dtype=np.int8)
+    codes[medians < COLD_BELOW] = COLD
+    codes[np.abs(medians - HEATER_SET_POINT) < HEATER_TOLERANCE] = HEATER
+    codes[np.isnan(medians)] = NO_DATA
+    return codes
+
+
+def _pick(sorted_vals, idx):
+    return np.take_along_axis(sorted_vals, idx[..., None], axis=-1)[..., 0]
+
+
+def rolling_stats(vals, window):
+    # (n, m) daily values (NaN = missing) -> rolling median and IQR over the trailing `window`
+    # days, NaN where the window has no data. Quartiles use the nearest-rank sample.
+    n_rows, n_days = vals.shape
+    median = np.full(vals.shape, np.nan)
+    iqr = np.full(vals.shape, np.nan)
+    if not n_days:
+        return median, iqr
+    padded = np.concatenate((np.full((n_rows, window - 1), np.nan), vals), axis=1)
+    for r in range(0, n_rows, BLOCK_ROWS):
+        windows = np.lib.stride_tricks.sliding_window_view(padded[r : r + BLOCK_ROWS], window, axis=1)
+        ordered = np.sort(windows, axis=-1)  # NaNs sort to the end
+        count = np.count_nonzero(~np.isnan(ordered), axis=-1)
+        has = count > 0
+        last = np.maximum(count - 1, 0)
+        # even count: mean of the two middle samples; odd count: both indices are the middle one
+        lo_mid = last // 2
+        hi_mid = np.minimum(count // 2, last)
+        med = 0.5 * (_pick(ordered, lo_mid) + _pick(ordered, hi_mid))
+        q1 = _pick(ordered, (last * 0.25).round().astype(np.int64))
+        q3 = _pick(ordered, (last * 0.75).round().astype(np.int64))
+        median[r : r + BLOCK_ROWS] = np.where(has, med, np.nan)
+        iqr[r : r + BLOCK_ROWS] = np.where(has, q3 - q1, np.nan)
+    return median, iqr
+
+
+class HeaterRegions:
+    def __init__(self, msids, times, median, spread, overall_median):
+        self.msids = list(msids)
+        self.times = times  # (n_days,) CXC secs, daily grid
+        self.median = median  # (n_msids, n_days) rolling median
+        self.spread = spread  # (n_msids, n_days) rolling IQR
+        self.overall_median = overall_median  # (n_msids,) median over the whole range
+        self.classes = classify_values(median)
+        self.overall = classify_values(overall_median)
+        self.failed = []  # MSIDs whose fetch failed (NO_DATA rows that are not really "no data")
+        self._row = {m.upper(): i for i, m in enumerate(self.msids)}  # case-insensitive, like the cache key
+
+    def __repr__(self):
+        return f"<HeaterRegions {len(self.msids)} MSIDs x {len(self.times)} days>"
+
+    def group(self, msid):
+        # Class name over the whole range (what gen_min_plot_data used to compute), None if no data
+        code = self.overall[self._row[msid.upper()]]
+        return CLASSES[code] if code != NO_DATA else None
+
+    def group_at(self, msid, t):
+        # Class name at time t (CXC secs or date string) from the rolling median
+        t = chandra_time_utils.date2secs(t) if isinstance(t, str) else t
+        i = np.clip(np.searchsorted(self.times, t, side="right") - 1, 0, len(self.times) - 1)
+        code = self.classes[self._row[msid.upper()], i]
+        return CLASSES[code] if code != NO_DATA else None
+
+    def first_in_group(self, msid):
+        # True for the first MSID (in list order) of its overall class: one legend entry per group
+        code = self.overall[self._row[msid.upper()]]
+        return code != NO_DATA and int(np.argmax(self.overall == code)) == self._row[msid.upper()]
+
+    def changes(self):
+        # Class changes over time: one row per (MSID, change), gaps in the data do not count
+        rows, days = np.nonzero(self.classes != NO_DATA)
+        codes = self.classes[rows, days]
+        # Consecutive valid days of the same MSID with a different class
+        change = (rows[1:] == rows[:-1]) & (codes[1:] != codes[:-1])
+        i = np.flatnonzero(change) + 1
+        return pd.DataFrame(
+            {
+                "MSID": np.array(self.msids, dtype=object)[rows[i]],
+                "time": self.times[days[i]],
+                "date": chandra_time_utils.secs2date(self.times[days[i]]),
+                "from": np.array(CLASSES, dtype=object)[codes[i - 1]],
+                "to": np.array(CLASSES, dtype=object)[codes[i]],
+                "median": self.median[rows[i], days[i]],
+            }
+        )
+
+    def to_pandas(self):
+        # One row per MSID: overall class and median, latest rolling median / spread / class
+        last = np.where(self.classes != NO_DATA, np.arange(len(self.times)), -1).max(axis=1, initial=-1)
+        idx = np.arange(len(self.msids))
+        has = last >= 0
+        latest = np.where(has, self.classes[idx, np.maximum(last, 0)], NO_DATA)
+        names = np.array(CLASSES + (None,), dtype=object)
+        return pd.DataFrame(
+            {
+                "group": names[self.overall],
+                "median": self.overall_median,
+                "latest_group": names[latest],
+                "latest_median": np.where(has, self.median[idx, np.maximum(last, 0)], np.nan),
+                "latest_spread": np.where(has, self.spread[idx, np.maximum(last, 0)], np.nan),
+            },
+            index=pd.Index(self.msids, name="MSID"),
+        )
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(
+            path,
+            msids=np.array(self.msids),
+            times=self.times,
+            median=self.median,
+            spread=self.spread,
+            overall_median=self.overall_median,
+        )
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f["msids"].tolist(), f["times"], f["median"], f["spread"], f["overall_median"])
+
+
+def classify(series, window_days=30, grid=None):
+    # series: {msid: TelemSeries / fetch_eng.Msid} of daily minimums (anything with .times/.vals)
+    msids = list(series)
+    spans = [(s.times[0], s.times[-1]) for s in series.values() if len(s.times)]
+    if grid is None:
+        if spans:
+            t0 = min(span[0] for span in spans)
+            grid = t0 + np.arange(int((max(span[1] for span in spans) - t0) // DAY) + 1) * DAY
+        else:
+            grid = np.empty(0)
+    vals = np.empty((len(msids), len(grid)))
+    for i, s in enumerate(series.values()):
+        vals[i] = msid_group_align.resample(s.times, s.vals, grid, method="nearest", max_gap=DAY / 2)
+    median, spread = rolling_stats(vals, window_days)
+    # nanmedian warns for MSIDs with no data at all; those stay NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        overall = np.nanmedian(vals, axis=1) if len(grid) else np.full(len(msids), np.nan)
+    return HeaterRegions(msids, grid, median, spread, overall)
+
+
+def _cache_file(msids, t1, t2, window_days, cache_dir):
+    key = repr((sorted(m.upper() for m in msids), round(t1, 3), round(t2, 3), window_days))
+    return os.path.join(cache_dir, "heater_regions", hashlib.sha1(key.encode()).hexdigest()[:16] + ".npz")
+
+
+def classify_range(
+    msids,
+    t1,
+    t2,
+    window_days=30,
+    cache_dir=CACHE_DIR,
+    refresh=False,
+    max_workers=8,
+    url_template=telem_series.MAUDE_URL,
+):
+    # Fetch STAT_1DAY_MIN_<msid> for every MSID (threaded), classify, and cache the result per
+    # (MSIDs, range, window) so the next call over the same range is one file read. MSIDs that
+    # could not be fetched are listed in regions.failed and the result is not cached.
+    t1 = chandra_time_utils.date2secs(t1) if isinstance(t1, str) else float(t1)
+    t2 = chandra_time_utils.date2secs(t2) if isinstance(t2, str) else float(t2)
+    path = _cache_file(msids, t1, t2, window_days, cache_dir)
+    if os.path.exists(path) and not refresh:
+        return HeaterRegions.load(path)
+
+    d1, d2 = chandra_time_utils.secs2date(np.array([t1, t2]))
+    failed = []
+
+    def fetch(msid):
+        try:
+            return telem_series.maude_series(
+                "STAT_1DAY_MIN_" + msid, d1, d2, url_template=url_template, raise_errors=True
+            )
+        except Exception:
+            failed.append(msid)
+            return telem_series.TelemSeries.empty(msid)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        fetched = list(pool.map(fetch, msids))
+    regions = classify(dict(zip(msids, fetched)), window_days=window_days)
+    # Only a complete result is cached; with failures the next call fetches again
+    regions.failed = sorted(failed)
+    if failed:
+        print(f"STAT_1DAY_MIN_ fetch failed for {len(failed)} MSIDs, result not cached: {' '.join(regions.failed)}")
+    else:
+        regions.save(path)
+    return regions
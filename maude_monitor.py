@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Live tail monitoring of the thermal list against MAUDE.
+#
+# Instead of re-running the whole limit violation cell, keep running state per MSID and only
+# fetch/process samples newer than the last one seen:
+#
+#     mon = maude_monitor.MaudeMonitor(num_msid, start="2023:044:17:41:00.000")
+#     for event in mon.poll():        # or mon.run(interval=30)
+#         print(event)
+#
+# Per MSID the state holds the running max/min, open violation spans and accumulated time
+# above caution/warning high (and below caution/warning low), computed the same way as
+# pylimmon.find_violation_time_spans: a span lasts from its first to its last violating sample.
+#
+# Point url_template at a local stand-in (see StandInMaude) to test without OCCweb.
+
+import json
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import chandra_time_utils
+import telem_series
+import thermal_limits
+
+Event = namedtuple("Event", ["kind", "msid", "time", "value", "limit"])
+
+# limit name -> True for "value above limit is a violation"
+LIMIT_SENSE = {"warning_high": True, "caution_high": True, "caution_low": False, "warning_low": False}
+
+
+class MsidState:
+    def __init__(self, msid, limits, mission_max=None, mission_min=None):
+        self.msid = msid
+        self.limits = {name: limits[name] for name in LIMIT_SENSE if limits.get(name) is not None}
+        self.last_time = None
+        self.last_val = None
+        self.last_violating = dict.fromkeys(self.limits, False)
+        self.max_val = None
+        self.max_time = None
+        self.min_val = None
+        self.min_time = None
+        # Extremes to beat for a "new mission max/min" event, e.g. from the mission scan
+        self.mission_max = mission_max
+        self.mission_min = mission_min
+        self.open_spans = dict.fromkeys(self.limits)  # limit name -> start time or None
+        self.closed_spans = {name: [] for name in self.limits}  # limit name -> [(start, stop), ...]
+        self.time_violating = dict.fromkeys(self.limits, 0.0)  # seconds
+
+    def update(self, times, vals):
+        # Fold in new samples (all later than last_time); returns a list of Events
+        events = []
+        if not len(times):
+            return events
+        times = np.asarray(times, dtype=np.float64)
+        vals = np.asarray(vals, dtype=np.float64)
+
+        i_max = np.argmax(vals)
+        if self.max_val is None or vals[i_max] > self.max_val:
+            self.max_val, self.max_time = vals[i_max], times[i_max]
+            if self.mission_max is not None and self.max_val > self.mission_max:
+                self.mission_max = self.max_val
+                events.append(Event("new_mission_max", self.msid, self.max_time, self.max_val, None))
+        i_min = np.argmin(vals)
+        if self.min_val is None or vals[i_min] < self.min_val:
+            self.min_val, self.min_time = vals[i_min], times[i_min]
+            if self.mission_min is not None and self.min_val < self.mission_min:
+                self.mission_min = self.min_val
+                events.append(Event("new_mission_min", self.msid, self.min_time, self.min_val, None))
+
+        # Stitch the previous last sample in front so spans carry across polls
+        if self.last_time is None:
+            t_ext, v_ext = times, vals
+        else:
+            t_ext, v_ext = np.concatenate(([self.last_time], times)), np.concatenate(([self.last_val], vals))
+        dt = np.diff(t_ext)
+        first = 0 if self.last_time is None else 1  # transitions at index 0 were handled last poll
+
+        for name, limit in self.limits.items():
+            bad = vals > limit if LIMIT_SENSE[name] else vals < limit
+            bad_ext = bad if self.last_time is None else np.concatenate(([self.last_violating[name]], bad))
+            self.last_violating[name] = bool(bad[-1])
+            if not np.any(bad_ext):
+                continue
+            self.time_violating[name] += dt[bad_ext[1:] & bad_ext[:-1]].sum()
+
+            # Only the (few) transitions are walked in Python, never the samples
+            enters = np.flatnonzero(bad_ext[1:] & ~bad_ext[:-1]) + 1
+            if self.last_time is None and bad_ext[0]:
+                enters = np.concatenate(([0], enters))
+            exits = np.flatnonzero(bad_ext[:-1] & ~bad_ext[1:])
+            transitions = sorted([(k, 0) for k in enters if k >= first] + [(k, 1) for k in exits])
+
+            for k, is_exit in transitions:
+                if is_exit:
+                    self.closed_spans[name].append((self.open_spans[name], t_ext[k]))
+                    self.open_spans[name] = None
+                    events.append(Event("limit_exit", self.msid, t_ext[k], v_ext[k], name))
+                else:
+                    self.open_spans[name] = t_ext[k]
+                    events.append(Event("limit_enter", self.msid, t_ext[k], v_ext[k], name))
+
+        self.last_time, self.last_val = times[-1], vals[-1]
+        return sorted(events, key=lambda e: e.time)
+
+    def hours_violating(self, name):
+        return self.time_violating[name] / 3600.0
+
+    def summary(self):
+        row = {
+            "MSID": self.msid,
+            "Max": self.max_val,
+            "Time of Max": chandra_time_utils.secs2date(self.max_time) if self.max_time is not None else None,
+            "Min": self.min_val,
+            "Time of Min": chandra_time_utils.secs2date(self.min_time) if self.min_time is not None else None,
+        }
+        for name in self.limits:
+            row[f"Hours {name}"] = self.hours_violating(name)
+            row[f"Open {name}"] = self.open_spans[name] is not None
+        return row
+
+
+class MaudeMonitor:
+    def __init__(
+        self,
+        msids,
+        start,
+        limits=None,
+        mission_extremes=None,
+        url_template=telem_series.MAUDE_URL,
+        max_workers=16,
+    ):
+        # limits: {msid: limits dict}; looked up with thermal_limits.get_current_limits when missing
+        # mission_extremes: {msid: (mission_min, mission_max)} to report new mission extremes
+        limits = limits or {}
+        mission_extremes = mission_extremes or {}
+        self.url_template = url_template
+        self.start = chandra_time_utils.date2secs(start) if isinstance(start, str) else start
+        self.max_workers = max_workers
+        self.states = {}
+        for msid in msids:
+            lims = limits.get(msid) or thermal_limits.get_current_limits(msid)
+            mission_min, mission_max = mission_extremes.get(msid, (None, None))
+            self.states[msid] = MsidState(msid, lims, mission_max=mission_max, mission_min=mission_min)
+
+    def _fetch_new(self, state, now):
+        t0 = self.start if state.last_time is None else state.last_time
+        series = telem_series.maude_series(
+            state.msid,
+            chandra_time_utils.secs2date(t0),
+            chandra_time_utils.secs2date(now),
+            url_template=self.url_template,
+        )
+        new = series.times > t0 if state.last_time is not None else series.times >= t0
+        return series.times[new], series.vals[new]
+
+    def poll(self, now=None):
+        # One pass over every MSID; only samples after each MSID's last timestamp are processed
+        now = chandra_time_utils.datetime642secs(np.datetime64("now")) if now is None else now
+        states = list(self.states.values())
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            fetched = list(pool.map(lambda state: self._fetch_new(state, now), states))
+
+        events = []
+        for state, (times, vals) in zip(states, fetched):
+            events.extend(state.update(times, vals))
+        return sorted(events, key=lambda e: e.time)
+
+    def run(self, interval=30, callback=print, stop_event=None):
+        # Poll forever (or until stop_event is set), handing every event to callback
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            t_start = time.monotonic()
+            for event in self.poll():
+                callback(event)
+            stop_event.wait(max(0.0, interval - (time.monotonic() - t_start)))
+
+    def summary(self):
+        import pandas as pd
+
+        return pd.DataFrame([state.summary() for state in self.states.values()])
+
+
+class StandInMaude:
+    # Minimal local stand-in for the MAUDE msid.json endpoint, serving TelemSeries from memory.
+    #
+    #     server = StandInMaude({"TSSMIN": series}).start()
+    #     mon = MaudeMonitor(["TSSMIN"], start, limits=..., url_template=server.url_template)
+    #     server.add("TSSMIN", more_times, more_vals)     # simulate new telemetry
+    #     server.stop()
+
+    def __init__(self, series=None, port=0):
+        self.series = {msid.lower(): (np.asarray(s.times), np.asarray(s.vals)) for msid, s in (series or {}).items()}
+        self.lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                body = json.dumps(stand_in.query(query["m"][0], query["ts"][0], query["tp"][0])).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.url_template = f"http://127.0.0.1:{self.server.server_port}/msid.json?m={{}}&ts={{}}&tp={{}}"
+
+    def add(self, msid, times, vals):
+        with self.lock:
+            old_times, old_vals = self.series.get(msid.lower(), (np.empty(0), np.empty(0)))
+            self.series[msid.lower()] = (np.concatenate((old_times, times)), np.concatenate((old_vals, vals)))
+
+    def query(self, msid, ts, tp):
+        with self.lock:
+            times, vals = self.series.get(msid, (np.empty(0), np.empty(0)))
+        t1, t2 = chandra_time_utils.date2secs(ts), chandra_time_utils.date2secs(tp)
+        ok = (times >= t1) & (times <= t2)
+        if not np.any(ok):
+            return {"data-fmt-1": {"times": [], "values": []}}
+        stamps = np.char.replace(np.char.replace(chandra_time_utils.secs2date(times[ok]), ":", ""), ".", "")
+        return {"data-fmt-1": {"times": stamps.tolist(), "values": vals[ok].tolist()}}
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
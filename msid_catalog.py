@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# MSID metadata catalog built once from the TDB: technical name, units, numeric/state type,
+# calibration type, polynomial degree and the valid calibration sets. Stored as one pickled
+# DataFrame indexed by MSID, so reports and conversions get metadata in a single file read
+# instead of a telemetry fetch per MSID (data.tdb.technical_name, data.unit, tdb.Tpc).
+#
+#     catalog = msid_catalog.get()          # loads the pickle, builds and saves it first if missing
+#     msid_catalog.build().save()           # rebuild after a TDB update, needs Ska.tdb
+#     catalog.technical_name("OOBTHR05"), catalog.unit("OOBTHR05"), catalog.get("4HLL2BT")["degree"]
+#
+# build_from_csv() does the same from the Access exports (TDB_MSID/TDB_POLY_CAL/TDB_POINT_PAIR)
+# when Ska.tdb is not available.
+
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = os.environ.get("THERMAL_CACHE", os.path.join(os.path.expanduser("~"), ".thermal_cache"))
+CATALOG_FILE = os.path.join(CACHE_DIR, "msid_catalog.pkl")
+
+COLUMNS = ["technical_name", "unit", "eng_unit", "type", "calibration_type", "degree", "calibration_sets"]
+
+NO_TECHNICAL_NAME = "Not in TDB"
+NO_UNIT = "None Found"
+
+
+def _upper_strip(series):
+    return series.astype(str).str.strip().str.upper()
+
+
+def _cal_sets(table):
+    # MSID -> "1,2" string of calibration set numbers (one groupby for the whole table)
+    if table is None or not len(table) or "CALIBRATION_SET_NUM" not in table:
+        return pd.Series(dtype=object)
+    sets = table.assign(MSID=_upper_strip(table["MSID"])).groupby("MSID")["CALIBRATION_SET_NUM"]
+    return sets.agg(lambda s: ",".join(str(int(v)) for v in sorted(set(s))))
+
+
+def build_catalog(msids, poly_cal=None, point_pair=None, state_codes=None, units=None):
+    # msids: tmsrment table (MSID, TECHNICAL_NAME, ENG_UNIT, ...) as a DataFrame.
+    # poly_cal / point_pair / state_codes: tpc / tpp / tsc tables. units: {msid: unit} in the
+    # unit system the notebooks fetch with (fetch_eng), falls back to the TDB ENG_UNIT.
+    cat = pd.DataFrame(index=pd.Index(_upper_strip(msids["MSID"]), name="MSID"))
+    cat["technical_name"] = msids["TECHNICAL_NAME"].astype(str).str.strip().values
+    cat["eng_unit"] = msids["ENG_UNIT"].fillna("").astype(str).str.strip().values if "ENG_UNIT" in msids else ""
+    cat = cat[~cat.index.duplicated()]
+
+    poly_sets = _cal_sets(poly_cal)
+    pp_sets = _cal_sets(point_pair)
+    sc_sets = _cal_sets(state_codes)
+
+    cat["calibration_type"] = "none"
+    cat.loc[cat.index.isin(pp_sets.index), "calibration_type"] = "point_pair"
+    cat.loc[cat.index.isin(poly_sets.index), "calibration_type"] = "poly"
+    cat.loc[cat.index.isin(sc_sets.index), "calibration_type"] = "state"
+    cat["type"] = np.where(cat["calibration_type"] == "state", "state", "numeric")
+
+    cat["calibration_sets"] = poly_sets.combine_first(pp_sets).combine_first(sc_sets).reindex(cat.index).fillna("")
+
+    cat["degree"] = -1
+    if poly_cal is not None and len(poly_cal):
+        # Degree of the lowest calibration set, the one the conversions use
+        poly = poly_cal.assign(MSID=_upper_strip(poly_cal["MSID"]))
+        if "CALIBRATION_SET_NUM" in poly:
+            poly = poly.sort_values("CALIBRATION_SET_NUM")
+        # Rows with no (or a non-numeric) degree are skipped; an MSID with none keeps -1
+        poly = poly.assign(DEG=pd.to_numeric(poly["DEG"], errors="coerce")).dropna(subset=["DEG"])
+        deg = poly.groupby("MSID")["DEG"].first()
+        cat.loc[deg.index.intersection(cat.index), "degree"] = deg.astype(int)
+
+    unit = pd.Series({str(k).upper(): v for k, v in (units or {}).items()}, dtype=object).reindex(cat.index)
+    cat["unit"] = unit.where(unit.notna() & (unit != ""), cat["eng_unit"])
+
+    return cat[COLUMNS]
+
+
+def build():
+    # From Ska.tdb tables, plus cheta's unit table for the units fetch_eng reports
+    import Ska.tdb
+
+    def table(name):
+        return pd.DataFrame(Ska.tdb.tables[name].data)
+
+    msids = table("tmsrment")
+    try:
+        from cheta import units as cheta_units
+
+        cheta_units.set_units("eng")
+        units = {m: cheta_units.get_msid_unit(m) for m in msids["MSID"].str.strip()}
+    except ImportError:
+        units = None
+    return MsidCatalog(build_catalog(msids, table("tpc"), table("tpp"), table("tsc"), units=units))
+
+
+def build_from_csv(msid_csv, poly_csv=None, point_pair_csv=None, state_code_csv=None):
+    tables = [pd.read_csv(path) if path else None for path in (msid_csv, poly_csv, point_pair_csv, state_code_csv)]
+    return MsidCatalog(build_catalog(*tables))
+
+
+class MsidCatalog:
+    def __init__(self, df):
+        self.df = df
+
+    def __len__(self):
+        return len(self.df)
+
+    def __contains__(self, msid):
+        return msid.upper() in self.df.index
+
+    def save(self, path=CATALOG_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.df.to_pickle(path)
+        return path
+
+    def get(self, msid, default=None):
+        # dict of the catalog columns for one MSID
+        try:
+            return self.df.loc[msid.upper()].to_dict()
+        except KeyError:
+            return default
+
+    def technical_name(self, msid, default=NO_TECHNICAL_NAME):
+        row = self.get(msid)
+        return row["technical_name"] if row else default
+
+    def unit(self, msid, default=NO_UNIT):
+        row = self.get(msid)
+        return row["unit"] if row and row["unit"] else default
+
+    def lookup(self, msids):
+        # Metadata for many MSIDs at once (missing MSIDs are NaN rows)
+        return self.df.reindex([m.upper() for m in msids])
+
+    def numeric(self):
+        return self.df.index[self.df["type"] == "numeric"].tolist()
+
+
+@lru_cache(maxsize=4)
+def load(path=CATALOG_FILE):
+    return MsidCatalog(pd.read_pickle(path))
+
+
+def get(path=CATALOG_FILE):
+    # load(path), building the catalog from Ska.tdb and saving it there first when there is no file yet
+    if not os.path.exists(path):
+        build().save(path)
+    return load(path)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Put a group of MSIDs (e.g. the six HRMA strut RAW_OOBTHR0x thermistors) on one shared time
+# grid so that group statistics are single numpy reductions over a (n_msids, n_times) array
+# instead of Python min()/max() over per-MSID lists.
+#
+#     group = msid_group_align.align([maude_series("RAW_" + m, t1, t2) for m in hrma], step=32.8)
+#     group.spread()            # max - min across sensors at every time step
+#     group.gradient("RAW_OOBTHR02", "RAW_OOBTHR05")
+#
+# Grid points that are outside a series' time span, or further than max_gap seconds from the
+# samples used, are NaN for that MSID.
+
+import numpy as np
+
+METHODS = ("nearest", "previous", "linear")
+
+
+def make_grid(series_list, step=None):
+    # Regular grid over the time span common to all series. Default step is the largest
+    # median sample spacing in the group, so the slowest MSID is not oversampled.
+    spans = [(s.times[0], s.times[-1]) for s in series_list if len(s)]
+    if not spans:
+        return np.empty(0)
+    tstart = max(span[0] for span in spans)
+    tstop = min(span[1] for span in spans)
+    if step is None:
+        steps = [np.median(np.diff(s.times)) for s in series_list if len(s) > 1]
+        if not steps:
+            # Only single samples: no cadence to build a grid from
+            return np.empty(0)
+        step = max(steps)
+    if tstop < tstart:
+        return np.empty(0)
+    return tstart + np.arange(int((tstop - tstart) // step) + 1) * step
+
+
+def resample(times, vals, grid, method="nearest", max_gap=None):
+    # One series onto `grid`; returns float64 array with NaN where there is no usable sample
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    out = np.full(len(grid), np.nan)
+    if not len(times):
+        return out
+    vals = np.asarray(vals, dtype=np.float64)
+    right = np.searchsorted(times, grid, side="right")
+    left = right - 1
+    inside = (grid >= times[0]) & (grid <= times[-1])
+
+    if method == "previous":
+        idx = np.clip(left, 0, len(times) - 1)
+        gap = grid - times[idx]
+    elif method == "nearest":
+        lo = np.clip(left, 0, len(times) - 1)
+        hi = np.clip(right, 0, len(times) - 1)
+        use_hi = np.abs(times[hi] - grid) < np.abs(grid - times[lo])
+        idx = np.where(use_hi, hi, lo)
+        gap = np.abs(times[idx] - grid)
+    else:
+        out[inside] = np.interp(grid[inside], times, vals)
+        if max_gap is not None:
+            lo = np.clip(left, 0, len(times) - 1)
+            hi = np.clip(right, 0, len(times) - 1)
+            out[(times[hi] - times[lo]) > max_gap] = np.nan
+        return out
+
+    ok = inside if method != "previous" else (grid >= times[0])
+    if max_gap is not None:
+        ok &= gap <= max_gap
+    out[ok] = vals[idx[ok]]
+    return out
+
+
+class AlignedGroup:
+    def __init__(self, msids, times, vals):
+        self.msids = list(msids)
+        self.times = times  # (n_times,) CXC secs
+        self.vals = vals  # (n_msids, n_times), NaN where missing
+
+    def __repr__(self):
+        return f"<AlignedGroup {len(self.msids)} MSIDs x {len(self.times)} times>"
+
+    def row(self, msid):
+        return self.vals[self.msids.index(msid)]
+
+    def min(self):
+        # Per-timestep min across sensors
+        return np.nanmin(self.vals, axis=0)
+
+    def max(self):
+        return np.nanmax(self.vals, axis=0)
+
+    def spread(self):
+        # Per-timestep max - min across sensors
+        return self.max() - self.min()
+
+    def argmax(self):
+        # Index (into msids) of the hottest sensor at every timestep, -1 if all missing
+        filled = np.where(np.isnan(self.vals), -np.inf, self.vals)
+        return np.where(np.all(np.isnan(self.vals), axis=0), -1, np.argmax(filled, axis=0))
+
+    def gradient(self, msid1, msid2):
+        # Sensor-to-sensor difference msid1 - msid2 at every timestep
+        return self.row(msid1) - self.row(msid2)
+
+    def gradients(self):
+        # All pairwise differences, shape (n_msids, n_msids, n_times); [i, j] = msids[i] - msids[j]
+        return self.vals[:, None, :] - self.vals[None, :, :]
+
+    def group_range(self):
+        # Overall (min, max) over the whole group and time range
+        return np.nanmin(self.vals), np.nanmax(self.vals)
+
+    def to_pandas(self):
+        import pandas as pd
+
+        return pd.DataFrame(self.vals.T, index=self.times, columns=self.msids)
+
+
+def align(series_list, grid=None, step=None, method="nearest", max_gap=None, dtype=np.float64):
+    # series_list: TelemSeries (or anything with .msid, .times, .vals)
+    if grid is None:
+        grid = make_grid(series_list, step=step)
+    grid = np.asarray(grid, dtype=np.float64)
+    vals = np.empty((len(series_list), len(grid)), dtype=dtype)
+    for i, s in enumerate(series_list):
+        vals[i] = resample(s.times, s.vals, grid, method=method, max_gap=max_gap)
+    return AlignedGroup([s.msid for s in series_list], grid, vals)
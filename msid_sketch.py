@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Mergeable per-MSID distribution sketches, so percentile questions ("is this 99.9th-percentile
+# hot for OOBTHR05?") can be answered from a few kB instead of refetching the mission.
+#
+# A sketch is a sparse fixed-width histogram: bin k holds the count of samples with
+# k * bin_width <= value < (k + 1) * bin_width. Two sketches with the same bin width merge by
+# adding counts, so sketches built over separate time chunks or in separate processes combine
+# exactly. Quantiles are good to bin_width / 2; min/max/count are exact.
+#
+#     store = msid_sketch.SketchStore("sketches/")
+#     store.update("OOBTHR05", data.times, data.vals)     # only samples after the stored tstop
+#     sk = store.load("OOBTHR05")
+#     sk.quantile(0.999), sk.percentile_of(112.3)
+
+import os
+
+import numpy as np
+
+BIN_WIDTH = 0.05
+
+CACHE_DIR = os.environ.get("THERMAL_CACHE", os.path.join(os.path.expanduser("~"), ".thermal_cache"))
+SKETCH_DIR = os.path.join(CACHE_DIR, "sketches")
+
+
+class MsidSketch:
+    def __init__(self, msid, bin_width=BIN_WIDTH):
+        self.msid = msid
+        self.bin_width = bin_width
+        self.bins = np.empty(0, dtype=np.int64)  # sorted bin indices
+        self.counts = np.empty(0, dtype=np.int64)
+        self.min = np.inf
+        self.max = -np.inf
+        self.tstart = np.inf  # time span covered, CXC secs
+        self.tstop = -np.inf
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    def __repr__(self):
+        return f"<MsidSketch {self.msid} n={len(self)} bins={len(self.bins)} range=({self.min}, {self.max})>"
+
+    def _add_bins(self, bins, counts):
+        bins = np.concatenate((self.bins, bins))
+        counts = np.concatenate((self.counts, counts))
+        self.bins, inverse = np.unique(bins, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts, minlength=len(self.bins)).astype(np.int64)
+
+    def update(self, vals, times=None):
+        # Add a chunk of samples (NaNs ignored)
+        vals = np.asarray(vals, dtype=np.float64)
+        ok = np.isfinite(vals)
+        vals = vals[ok]
+        if not len(vals):
+            return self
+        bins, counts = np.unique(np.floor(vals / self.bin_width).astype(np.int64), return_counts=True)
+        self._add_bins(bins, counts)
+        self.min = min(self.min, vals.min())
+        self.max = max(self.max, vals.max())
+        if times is not None:
+            times = np.asarray(times)[ok]
+            self.tstart = min(self.tstart, times[0])
+            self.tstop = max(self.tstop, times[-1])
+        return self
+
+    def merge(self, other):
+        # Combine with another sketch of the same MSID / bin width (other chunk or process)
+        if not np.isclose(other.bin_width, self.bin_width):
+            raise ValueError("can only merge sketches with the same bin_width")
+        self._add_bins(other.bins, other.counts)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.tstart = min(self.tstart, other.tstart)
+        self.tstop = max(self.tstop, other.tstop)
+        return self
+
+    def quantile(self, q):
+        # Value(s) at quantile q in [0, 1] (bin centre, clipped to the exact min/max)
+        q = np.asarray(q, dtype=np.float64)
+        if not len(self.counts):
+            return np.full(q.shape, np.nan)
+        cum = np.cumsum(self.counts)
+        i = np.searchsorted(cum, q * cum[-1], side="left").clip(0, len(cum) - 1)
+        vals = (self.bins[i] + 0.5) * self.bin_width
+        return np.clip(vals, self.min, self.max)
+
+    def percentile_of(self, value):
+        # Percent of samples <= value: "how unusual is this value" (100 = hotter than everything)
+        value = np.asarray(value, dtype=np.float64)
+        if not len(self.counts):
+            return np.full(value.shape, np.nan)
+        cum = np.concatenate(([0], np.cumsum(self.counts)))
+        k = np.floor(value / self.bin_width).astype(np.int64)
+        # Whole bins below value's bin, plus the part of its own bin that lies below value
+        i = np.searchsorted(self.bins, k, side="left")
+        below = cum[i]
+        in_bin = (i < len(self.bins)) & (self.bins[np.minimum(i, len(self.bins) - 1)] == k)
+        frac = value / self.bin_width - k
+        below = below + np.where(in_bin, frac * self.counts[np.minimum(i, len(self.bins) - 1)], 0)
+        pct = 100.0 * below / cum[-1]
+        return np.where(value >= self.max, 100.0, np.where(value < self.min, 0.0, pct))
+
+    def histogram(self):
+        # (bin left edges, counts) of the non-empty bins
+        return self.bins * self.bin_width, self.counts
+
+    def to_dict(self):
+        return {
+            "msid": self.msid,
+            "bin_width": self.bin_width,
+            "bins": self.bins,
+            "counts": self.counts,
+            "min": self.min,
+            "max": self.max,
+            "tstart": self.tstart,
+            "tstop": self.tstop,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        sketch = cls(str(d["msid"]), float(d["bin_width"]))
+        sketch.bins = np.asarray(d["bins"], dtype=np.int64)
+        sketch.counts = np.asarray(d["counts"], dtype=np.int64)
+        for key in ("min", "max", "tstart", "tstop"):
+            setattr(sketch, key, float(d[key]))
+        return sketch
+
+    def save(self, path):
+        # Bins are delta-encoded so the compressed file stays small
+        d = self.to_dict()
+        d["bins"] = np.diff(self.bins, prepend=0)
+        np.savez_compressed(path, **d)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            d = {key: f[key] for key in f.files}
+        d["bins"] = np.cumsum(d["bins"])
+        return cls.from_dict(d)
+
+
+def merge_all(sketches):
+    # Merge an iterable of sketches (e.g. one per time chunk or worker process) into a new one
+    sketches = list(sketches)
+    out = MsidSketch(sketches[0].msid, sketches[0].bin_width)
+    for sketch in sketches:
+        out.merge(sketch)
+    return out
+
+
+class SketchStore:
+    # Directory of <msid>.npz sketches that can be updated incrementally
+
+    def __init__(self, path=SKETCH_DIR, bin_width=BIN_WIDTH):
+        self.path = path
+        self.bin_width = bin_width
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, msid):
+        return os.path.join(self.path, f"{msid.upper()}.npz")
+
+    def msids(self):
+        return sorted(name[:-4] for name in os.listdir(self.path) if name.endswith(".npz"))
+
+    def load(self, msid):
+        if os.path.exists(self._file(msid)):
+            return MsidSketch.load(self._file(msid))
+        return MsidSketch(msid.upper(), self.bin_width)
+
+    def save(self, sketch):
+        sketch.save(self._file(sketch.msid))
+
+    def update(self, msid, times, vals):
+        # Add only samples newer than what the stored sketch already covers
+        sketch = self.load(msid)
+        times = np.asarray(times)
+        new = times > sketch.tstop
+        if np.any(new):
+            sketch.update(np.asarray(vals)[new], times[new])
+            self.save(sketch)
+        return sketch
+
+    def merge(self, sketch):
+        # Fold in a sketch built elsewhere (another process / time chunk) and save
+        stored = self.load(sketch.msid)
+        stored.merge(sketch)
+        self.save(stored)
+        return stored
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Lightweight per-stage / per-MSID instrumentation for the thermal scans.
+#
+# Usage:
+#     import pipeline_stats as ps
+#     ps.enable()
+#     with ps.stage("fetch", msid):
+#         data = fetch_eng.Msid(msid, t1, t2)
+#     ps.count("fetch", msid, nbytes=data.vals.nbytes + data.times.nbytes, samples=len(data.vals))
+#     token = ps.start("mask", msid)
+#     ...
+#     ps.stop(token)
+#     ps.summary()          # pandas DataFrame of totals per stage (by="msid": per MSID,
+#                           # by=None: one row per (stage, msid))
+#     ps.to_json("stats.json")
+#
+# When disabled (the default) stage() returns a shared no-op context manager and
+# count() returns immediately, so the calls can stay in the hot loop. Updates take a lock, so
+# stages and counts can be recorded from worker threads (maude_monitor, analysis_service, ...).
+
+import json
+import threading
+import time
+from collections import defaultdict
+
+STAGES = ["fetch", "decode", "filter_bad", "mask", "reduce", "limits", "write"]
+
+_FIELDS = ["calls", "wall_time", "nbytes", "samples", "cache_hits"]
+
+_enabled = False
+_records = defaultdict(lambda: dict.fromkeys(_FIELDS, 0))
+_lock = threading.Lock()
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("key", "t0")
+
+    def __init__(self, key):
+        self.key = key
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.t0
+        with _lock:
+            rec = _records[self.key]
+            rec["calls"] += 1
+            rec["wall_time"] += elapsed
+        return False
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _records.clear()
+
+
+def stage(name, msid=None):
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage((name, msid))
+
+
+# start()/stop() for notebook loops where a `with` block would not survive a `continue`
+def start(name, msid=None):
+    if not _enabled:
+        return None
+    return ((name, msid), time.perf_counter())
+
+
+def stop(token):
+    if token is None:
+        return
+    key, t0 = token
+    elapsed = time.perf_counter() - t0
+    with _lock:
+        rec = _records[key]
+        rec["calls"] += 1
+        rec["wall_time"] += elapsed
+
+
+def count(name, msid=None, nbytes=0, samples=0, cache_hits=0):
+    if not _enabled:
+        return
+    with _lock:
+        rec = _records[(name, msid)]
+        rec["nbytes"] += nbytes
+        rec["samples"] += samples
+        rec["cache_hits"] += cache_hits
+
+
+def records():
+    # Plain list of dicts, one per (stage, msid)
+    with _lock:
+        return [{"stage": name, "msid": msid, **rec} for (name, msid), rec in _records.items()]
+
+
+def summary(by="stage"):
+    # by="stage": totals per stage, by="msid": totals per MSID, by=None: every (stage, msid) row
+    import pandas as pd
+
+    df = pd.DataFrame(records(), columns=["stage", "msid"] + _FIELDS)
+    if by is None or df.empty:
+        return df.sort_values("wall_time", ascending=False, ignore_index=True)
+
+    out = df.groupby(by, dropna=False)[_FIELDS].sum()
+    return out.sort_values("wall_time", ascending=False)
+
+
+def to_json(path=None):
+    payload = json.dumps(records(), indent=1, default=float)
+    if path is not None:
+        with open(path, "w") as f:
+            f.write(payload)
+    return payload
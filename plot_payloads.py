@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Plotly trace builders that send x/y as base64 typed arrays ({"dtype": "f4", "bdata": ...},
+# understood by plotly.js >= 2.28) instead of JSON number lists, plus a cache of finished
+# figure specs keyed by (MSIDs, time range, resolution).
+#
+# Traces use plain plotly.js attribute names (line: {color}), so the dicts can be handed to
+# pio.show or served as JSON as-is. x values go out as float64 milliseconds since 1970 (what
+# plotly uses for numeric x on a date axis), so the figure layout must set
+# "xaxis": {"type": "date"} or the axis shows raw numbers. y values keep their own dtype when
+# plotly supports it (float32 stays 4 bytes/sample).
+#
+#     trace = plot_payloads.envelope_trace(dates, mins, maxs, name=msid, fillcolor=..., line_color=...)
+#     fig = plot_payloads.figure_cache.get_or_build(msids, t1, t2, 2000, build_fn, version=spec_hash(layout))
+#
+# Cached figures are keyed by the MSIDs in order (trace order is part of the figure), the range,
+# the resolution and a caller-supplied version (e.g. a hash of the layout), so a layout edit is a
+# new key. Figures with an empty trace (MAUDE returned nothing) are never cached.
+
+import base64
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+import chandra_time_utils
+
+CACHE_DIR = os.environ.get("THERMAL_CACHE", os.path.join(os.path.expanduser("~"), ".thermal_cache"))
+
+# numpy dtype -> plotly typed array code (plotly has no 64-bit ints)
+PLOTLY_DTYPES = {
+    np.dtype("float64"): "f8",
+    np.dtype("float32"): "f4",
+    np.dtype("int32"): "i4",
+    np.dtype("uint32"): "u4",
+    np.dtype("int16"): "i2",
+    np.dtype("uint16"): "u2",
+    np.dtype("int8"): "i1",
+    np.dtype("uint8"): "u1",
+}
+
+
+def typed_array(vals):
+    # numpy array -> {"dtype", "bdata"} (little-endian); unsupported dtypes go out as float64
+    vals = np.asarray(vals)
+    if vals.dtype.newbyteorder("=") not in PLOTLY_DTYPES:
+        vals = vals.astype(np.float64)
+    vals = vals.astype(vals.dtype.newbyteorder("<"), copy=False)
+    return {"dtype": PLOTLY_DTYPES[vals.dtype.newbyteorder("=")], "bdata": base64.b64encode(vals.tobytes()).decode()}
+
+
+def date_ms(x):
+    # datetime64 / pandas dates / CXC secs -> float64 ms since 1970 for a plotly date axis
+    x = np.asarray(x)
+    if not np.issubdtype(x.dtype, np.datetime64):
+        x = chandra_time_utils.secs2datetime64(x)
+    return x.astype("datetime64[ms]").astype(np.int64).astype(np.float64)
+
+
+def minmax_decimate(x, y, n_bins):
+    # Keep the min and max sample of each of n_bins equal-count bins so spikes survive decimation
+    y = np.asarray(y)
+    if n_bins is None or len(y) <= 2 * n_bins:
+        return np.asarray(x), y
+    edges = np.linspace(0, len(y), n_bins + 1).astype(np.int64)
+    # Sort by (bin, value): the first/last entry of each bin is its min/max sample
+    bins = np.repeat(np.arange(n_bins), np.diff(edges))
+    by_bin_then_val = np.lexsort((y, bins))
+    lo = by_bin_then_val[edges[:-1]]
+    hi = by_bin_then_val[edges[1:] - 1]
+    keep = np.unique(np.concatenate((lo, hi)))
+    return np.asarray(x)[keep], y[keep]
+
+
+def line_trace(x, y, name, line_color=None, group=None, showlegend=True, resolution=None, trace_type="scattergl"):
+    x, y = minmax_decimate(x, y, resolution)
+    trace = {
+        "type": trace_type,
+        "x": typed_array(date_ms(x)),
+        "y": typed_array(y),
+        "name": name,
+        "line": {"color": line_color} if line_color else None,
+        "legendgroup": group,
+        "showlegend": showlegend,
+    }
+    return {key: val for key, val in trace.items() if val is not None}
+
+
+def envelope(x_min, y_min, x_max, y_max):
+    # Closed min/max band for fill="toself": min forward then max backward, one allocation each
+    n_min, n_max = len(y_min), len(y_max)
+    x = np.empty(n_min + n_max, dtype=np.float64)
+    x[:n_min] = date_ms(x_min)
+    x[n_min:] = date_ms(x_max)[::-1]
+    y = np.empty(n_min + n_max, dtype=np.result_type(np.asarray(y_min).dtype, np.asarray(y_max).dtype))
+    y[:n_min] = y_min
+    y[n_min:] = np.asarray(y_max)[::-1]
+    return x, y
+
+
+def envelope_trace(x_min, y_min, x_max, y_max, name, fillcolor=None, line_color=None, group=None, resolution=None):
+    x_min, y_min = minmax_decimate(x_min, y_min, resolution)
+    x_max, y_max = minmax_decimate(x_max, y_max, resolution)
+    x, y = envelope(x_min, y_min, x_max, y_max)
+    trace = {
+        "type": "scattergl",
+        "x": typed_array(x),
+        "y": typed_array(y),
+        "name": name,
+        "fill": "toself",
+        "fillcolor": fillcolor,
+        "line": {"color": line_color} if line_color else None,
+        "legendgroup": group,
+    }
+    return {key: val for key, val in trace.items() if val is not None}
+
+
+def spec_hash(spec):
+    # Short stable hash of a JSON-able dict (layout, style options), for FigureCache versions
+    return hashlib.sha1(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+def has_empty_trace(fig):
+    # True if any trace has no y values (typed array with no bytes, or an empty list)
+    for trace in fig.get("data", []):
+        y = trace.get("y")
+        if y is None or (isinstance(y, dict) and not y.get("bdata")) or (isinstance(y, list) and not y):
+            return True
+    return False
+
+
+class FigureCache:
+    # Finished figure dicts keyed by (MSIDs, t1, t2, resolution, version): in memory (LRU) and as
+    # JSON on disk
+
+    def __init__(self, cache_dir=os.path.join(CACHE_DIR, "figures"), max_items=32):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self._mem = OrderedDict()
+
+    @staticmethod
+    def key(msids, t1, t2, resolution, version=None):
+        return (tuple(m.upper() for m in msids), str(t1), str(t2), resolution, version)
+
+    def _file(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(repr(key).encode()).hexdigest()[:20] + ".json")
+
+    def get(self, msids, t1, t2, resolution, version=None):
+        key = self.key(msids, t1, t2, resolution, version)
+        if key in self._mem:
+            self._mem.move_to_end(key)
+            return self._mem[key]
+        path = self._file(key)
+        if os.path.exists(path):
+            with open(path) as f:
+                fig = json.load(f)
+            self._remember(key, fig)
+            return fig
+        return None
+
+    def put(self, msids, t1, t2, resolution, fig, version=None):
+        # Figures with an empty trace are returned but not cached
+        if has_empty_trace(fig):
+            return fig
+        key = self.key(msids, t1, t2, resolution, version)
+        self._remember(key, fig)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._file(key), "w") as f:
+            json.dump(fig, f)
+        return fig
+
+    def get_or_build(self, msids, t1, t2, resolution, build, version=None):
+        # build(msids, t1, t2, resolution) -> figure dict, only called on a cache miss
+        fig = self.get(msids, t1, t2, resolution, version)
+        if fig is None:
+            fig = self.put(msids, t1, t2, resolution, build(msids, t1, t2, resolution), version)
+        return fig
+
+    def _remember(self, key, fig):
+        self._mem[key] = fig
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+
+figure_cache = FigureCache()
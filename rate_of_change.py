@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Windowed rate of change (dT/dt) for the thermal list, using the same times/vals arrays and
+# good-sample mask as the max/min scan so it can run in the same loop without another fetch.
+#
+# The rate at sample i is the difference of the mean value over the second half and the first
+# half of the window ending at t_i, divided by the difference of their mean times. Averaging the
+# two halves keeps single noisy samples from dominating, and a window that spans a data gap
+# (dt > max_gap, by default 5x the median sample spacing) is NaN instead of a bogus jump, even
+# when the gap is shorter than the window. Everything is prefix sums + searchsorted, no
+# per-sample Python loops. Rates are in units per hour.
+
+import numpy as np
+
+
+def gap_threshold(times):
+    # Spacing that counts as a data gap: well beyond the normal cadence (5x the median spacing)
+    return 5 * np.median(np.diff(times))
+
+
+def rates(times, vals, good=None, window=3600.0, max_gap=None, min_samples=2):
+    # -> (times, rates) for the good samples; rate is NaN where the window is unusable
+    times = np.asarray(times, dtype=np.float64)
+    vals = np.asarray(vals, dtype=np.float64)
+    if good is not None:
+        times, vals = times[good], vals[good]
+    n = len(times)
+    if n < 2:
+        return times, np.full(n, np.nan)
+
+    if max_gap is None:
+        # Any spacing well beyond the cadence breaks the windows that span it, however short
+        max_gap = gap_threshold(times)
+
+    hours = (times - times[0]) / 3600.0
+    cum_t = np.concatenate(([0.0], np.cumsum(hours)))
+    cum_v = np.concatenate(([0.0], np.cumsum(vals)))
+    gaps = np.concatenate(([0], np.cumsum(np.diff(times) > max_gap)))
+
+    idx = np.arange(n)
+    start = np.searchsorted(times, times - window, side="left")
+    mid = np.searchsorted(times, times - window / 2, side="left")
+    n1 = mid - start
+    n2 = idx + 1 - mid
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_t1 = (cum_t[mid] - cum_t[start]) / n1
+        mean_t2 = (cum_t[idx + 1] - cum_t[mid]) / n2
+        mean_v1 = (cum_v[mid] - cum_v[start]) / n1
+        mean_v2 = (cum_v[idx + 1] - cum_v[mid]) / n2
+        out = (mean_v2 - mean_v1) / (mean_t2 - mean_t1)
+
+    bad = (n1 < 1) | (n2 < 1) | (n1 + n2 < min_samples) | (gaps[start] != gaps)
+    bad |= times - times[start] < window / 2  # window not yet half filled (start of data / after gap)
+    out[bad] = np.nan
+    return times, out
+
+
+def rate_extremes(times, rates):
+    # Fastest heating and cooling: (max_rate, time_of_max, min_rate, time_of_min); NaNs ignored
+    if not np.any(np.isfinite(rates)):
+        return np.nan, None, np.nan, None
+    i_max = np.nanargmax(rates)
+    i_min = np.nanargmin(rates)
+    return rates[i_max], times[i_max], rates[i_min], times[i_min]
+
+
+def flag_windows(times, rates, threshold):
+    # Spans where |rate| > threshold -> list of (start, stop, peak rate), found from transitions only
+    over = np.abs(np.nan_to_num(rates)) > threshold
+    if not np.any(over):
+        return []
+    edges = np.diff(np.concatenate(([False], over, [False])).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1) - 1
+    # Peak |rate| per span (loop is over spans, not samples; sign kept from the peak sample)
+    absr = np.where(over, np.abs(rates), 0.0)
+    peak_idx = [s + np.argmax(absr[s : e + 1]) for s, e in zip(starts, stops)]
+    return [(times[s], times[e], rates[p]) for s, e, p in zip(starts, stops, peak_idx)]
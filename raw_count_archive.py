@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Compact local archive for raw thermistor counts (RAW_<msid>), one file per MSID.
+#
+# Layout (little-endian):
+#     file header : magic b"RCA1", tick (float64 seconds), msid (16 bytes, NUL padded)
+#     block header: n (uint32), tstart, tstop (float64 CXC secs), vmin, vmax (uint16), nbytes (uint32)
+#     block data  : zlib( varint(time deltas in ticks) + low bytes of counts + high bytes of counts )
+#
+# Counts are stored as uint16 (they never exceed 16 bits), times as varint-encoded deltas
+# from the block start in units of `tick` (1 ms by default, which is the MAUDE resolution).
+# The min/max in each block header let max/min queries skip every block that cannot hold
+# the extreme, and the file is read through np.memmap so only touched blocks are paged in.
+
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from telem_series import TelemSeries
+
+MAGIC = b"RCA1"
+FILE_HEADER = struct.Struct("<4sd16s")
+BLOCK_HEADER = struct.Struct("<IddHHI")
+BLOCK_SIZE = 8192
+
+
+def _varint_encode(vals):
+    # Unsigned LEB128 of a uint64 array, vectorized per byte position
+    vals = np.asarray(vals, dtype=np.uint64)
+    nbytes = np.ones(len(vals), dtype=np.int64)
+    rest = vals >> np.uint64(7)
+    while np.any(rest):
+        nbytes += rest > 0
+        rest >>= np.uint64(7)
+
+    out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+    starts = np.cumsum(nbytes) - nbytes
+    for k in range(int(nbytes.max(initial=0))):
+        sel = nbytes > k
+        byte = (vals[sel] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (nbytes[sel] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[sel] + k] = (byte | more).astype(np.uint8)
+    return out
+
+
+def _varint_decode(buf, n):
+    # Inverse of _varint_encode for exactly n values; returns (values, bytes consumed)
+    buf = np.asarray(buf, dtype=np.uint8)
+    ends = np.flatnonzero((buf & 0x80) == 0)[:n]
+    if len(ends) < n:
+        raise ValueError("truncated varint data")
+    used = int(ends[-1]) + 1 if n else 0
+    buf = buf[:used]
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    owner = np.repeat(np.arange(n), ends - starts + 1)
+    shift = (np.arange(used) - starts[owner]) * 7
+    parts = (buf & 0x7F).astype(np.uint64) << shift.astype(np.uint64)
+    return np.add.reduceat(parts, starts) if n else np.empty(0, np.uint64), used
+
+
+def _encode_block(times, counts, tick):
+    ticks = np.round((times - times[0]) / tick).astype(np.int64)
+    deltas = np.diff(ticks, prepend=ticks[0])
+    counts = counts.astype("<u2")
+    payload = _varint_encode(deltas).tobytes() + (counts & 0xFF).astype(np.uint8).tobytes()
+    payload += (counts >> 8).astype(np.uint8).tobytes()
+    data = zlib.compress(payload, 6)
+    header = BLOCK_HEADER.pack(len(counts), times[0], times[-1], counts.min(), counts.max(), len(data))
+    return header + data
+
+
+def _decode_block(mm, offset, n, tstart, nbytes, tick):
+    payload = np.frombuffer(zlib.decompress(mm[offset : offset + nbytes]), dtype=np.uint8)
+    deltas, used = _varint_decode(payload, n)
+    times = tstart + np.cumsum(deltas).astype(np.float64) * tick
+    lo = payload[used : used + n].astype(np.uint16)
+    hi = payload[used + n : used + 2 * n].astype(np.uint16)
+    return times, lo | (hi << 8)
+
+
+def _as_counts(vals):
+    vals = np.asarray(vals)
+    if vals.dtype != np.uint16:
+        if len(vals) and (np.nanmin(vals) < 0 or np.nanmax(vals) > 65535 or np.any(vals != np.round(vals))):
+            raise ValueError("raw counts must be integers in 0..65535")
+        vals = vals.astype(np.uint16)
+    return vals
+
+
+def write(path, msid, times, counts, tick=0.001, block_size=BLOCK_SIZE):
+    # Create (or overwrite) an archive file from sorted times and counts
+    with open(path, "wb") as f:
+        f.write(FILE_HEADER.pack(MAGIC, tick, msid.encode()[:16]))
+    append(path, times, counts, block_size=block_size)
+
+
+def append(path, times, counts, block_size=BLOCK_SIZE):
+    # Add new samples (all later than what is already stored) as new blocks
+    times = np.asarray(times, dtype=np.float64)
+    counts = _as_counts(counts)
+    if np.any(np.diff(times) < 0):
+        raise ValueError("times must be sorted")
+
+    archive = RawCountArchive(path)
+    tick, tstop = archive.tick, archive.tstop
+    del archive  # drop the memmap before writing (Windows will not append to a mapped file)
+    if len(times) and times[0] < tstop:
+        raise ValueError(f"new samples start before the end of {path}")
+
+    with open(path, "ab") as f:
+        for i in range(0, len(times), block_size):
+            f.write(_encode_block(times[i : i + block_size], counts[i : i + block_size], tick))
+
+
+def write_series(path, series, tick=0.001, block_size=BLOCK_SIZE):
+    # Store a TelemSeries of raw counts, e.g. telem_series.maude_series("RAW_OOBTHR02", t1, t2)
+    write(path, series.msid, series.times, series.vals, tick=tick, block_size=block_size)
+
+
+class RawCountArchive:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, self.tick, msid = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a raw count archive")
+        self.msid = msid.rstrip(b"\0").decode()
+
+        size = os.path.getsize(path)
+        self._mm = np.memmap(path, dtype=np.uint8, mode="r") if size > FILE_HEADER.size else np.empty(0, np.uint8)
+
+        # Walk the block headers once; the index is tiny compared with the data
+        rows = []
+        offset = FILE_HEADER.size
+        while offset < size:
+            n, tstart, tstop, vmin, vmax, nbytes = BLOCK_HEADER.unpack(
+                self._mm[offset : offset + BLOCK_HEADER.size].tobytes()
+            )
+            rows.append((offset + BLOCK_HEADER.size, n, tstart, tstop, vmin, vmax, nbytes))
+            offset += BLOCK_HEADER.size + nbytes
+
+        index = np.array(rows, dtype=np.float64).reshape(-1, 7)
+        self.offsets = index[:, 0].astype(np.int64)
+        self.n = index[:, 1].astype(np.int64)
+        self.tstarts = index[:, 2]
+        self.tstops = index[:, 3]
+        self.vmins = index[:, 4].astype(np.uint16)
+        self.vmaxes = index[:, 5].astype(np.uint16)
+        self.nbytes = index[:, 6].astype(np.int64)
+
+    @property
+    def n_blocks(self):
+        return len(self.offsets)
+
+    @property
+    def tstop(self):
+        return self.tstops[-1] if self.n_blocks else -np.inf
+
+    def __len__(self):
+        return int(self.n.sum())
+
+    def block(self, i):
+        return _decode_block(self._mm, self.offsets[i], self.n[i], self.tstarts[i], self.nbytes[i], self.tick)
+
+    def _blocks_in(self, t1, t2):
+        t1 = -np.inf if t1 is None else t1
+        t2 = np.inf if t2 is None else t2
+        overlap = np.flatnonzero((self.tstops >= t1) & (self.tstarts <= t2))
+        inside = (self.tstarts[overlap] >= t1) & (self.tstops[overlap] <= t2)
+        return overlap, inside, t1, t2
+
+    def read(self, t1=None, t2=None):
+        # TelemSeries of counts in [t1, t2] (CXC secs); only overlapping blocks are decoded
+        overlap, _, t1, t2 = self._blocks_in(t1, t2)
+        if not len(overlap):
+            return TelemSeries.empty(self.msid, dtype=np.uint16, source="archive")
+        parts = [self.block(i) for i in overlap]
+        times = np.concatenate([p[0] for p in parts])
+        counts = np.concatenate([p[1] for p in parts])
+        ok = (times >= t1) & (times <= t2)
+        return TelemSeries(self.msid, times[ok], counts[ok], source="archive")
+
+    def extreme(self, t1=None, t2=None, kind="max"):
+        # (value, time) of the max or min count in [t1, t2], decoding as few blocks as possible
+        overlap, inside, t1, t2 = self._blocks_in(t1, t2)
+        if not len(overlap):
+            return None, None
+
+        # Work in "bigger is better" space so max and min share one code path
+        sign = 1 if kind == "max" else -1
+        bound = sign * (self.vmaxes if kind == "max" else self.vmins)[overlap].astype(np.int64)
+
+        # Fully covered blocks: the header value is exact, only the best one is decoded (for its
+        # time). argmax takes the first of tied blocks / samples, i.e. the earliest, like np.argmax
+        # on the whole series.
+        best, best_time = -np.inf, None
+        if np.any(inside):
+            best = bound[inside].max()
+            times, counts = self.block(overlap[inside][np.argmax(bound[inside])])
+            best_time = times[np.argmax(sign * counts.astype(np.int64))]
+
+        # Partly covered blocks only need decoding if their header could beat (or tie) the best so
+        # far; on a tie the earlier time wins
+        order = np.argsort(-bound[~inside], kind="stable")
+        for i, b in zip(overlap[~inside][order], bound[~inside][order]):
+            if b < best:
+                break
+            times, counts = self.block(i)
+            ok = (times >= t1) & (times <= t2)
+            if np.any(ok):
+                j = np.argmax(sign * counts[ok].astype(np.int64))
+                value = sign * int(counts[ok][j])
+                if value > best or (value == best and times[ok][j] < best_time):
+                    best, best_time = value, times[ok][j]
+
+        if best == -np.inf:
+            return None, None
+        return int(sign * best), best_time
+
+    def max(self, t1=None, t2=None):
+        return self.extreme(t1, t2, kind="max")
+
+    def min(self, t1=None, t2=None):
+        return self.extreme(t1, t2, kind="min")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Common container for a single MSID time series, whether it came from cheta (fetch_eng.Msid)
+# or from a MAUDE JSON query.
+#
+# The series holds references to the original numpy arrays (no copy, dtype kept as-is:
+# float32 engineering values, uint16 raw counts, ...) and hands out numpy, pandas or
+# Arrow views on demand. "No data" is an empty series with the right dtypes rather than
+# a DataFrame with a single None row.
+#
+# It exposes .times / .vals like fetch_eng.Msid, so the existing mask code works on either.
+
+import numpy as np
+import pandas as pd
+import requests
+
+import chandra_time_utils
+import pipeline_stats
+
+MAUDE_URL = "https://occweb.cfa.harvard.edu/maude/mrest/FLIGHT/msid.json?m={}&ts={}&tp={}"
+
+
+class TelemSeries:
+    def __init__(self, msid, times, vals, unit=None, source=None):
+        self.msid = msid
+        self.times = np.asarray(times, dtype=np.float64)  # CXC seconds; no copy if already float64
+        self.vals = np.asarray(vals)
+        self.unit = unit
+        self.source = source
+        self._dates = None
+
+    @classmethod
+    def empty(cls, msid, dtype=np.float64, unit=None, source=None):
+        return cls(msid, np.empty(0, dtype=np.float64), np.empty(0, dtype=dtype), unit=unit, source=source)
+
+    @classmethod
+    def from_msid(cls, data):
+        # Wrap a fetch_eng.Msid (after filter_bad if wanted) without copying times/vals
+        try:
+            unit = data.unit
+        except KeyError:
+            unit = None
+        return cls(data.msid, data.times, data.vals, unit=unit, source="cxc")
+
+    @classmethod
+    def from_maude_json(cls, msid, jsondata, dtype=None):
+        fmt = jsondata["data-fmt-1"]
+        times = chandra_time_utils.maude2secs(fmt["times"]) if len(fmt["times"]) else np.empty(0)
+        vals = pd.to_numeric(np.asarray(fmt["values"]))
+        vals = np.asarray(vals, dtype=dtype) if dtype is not None else np.asarray(vals)
+        return cls(msid, times, vals, source="maude")
+
+    def __len__(self):
+        return len(self.vals)
+
+    def __repr__(self):
+        return f"<TelemSeries {self.msid} n={len(self)} dtype={self.vals.dtype} source={self.source}>"
+
+    @property
+    def dates(self):
+        # datetime64[ns] UTC, computed once on first use
+        if self._dates is None:
+            self._dates = chandra_time_utils.secs2datetime64(self.times)
+        return self._dates
+
+    def select(self, mask):
+        # Boolean or index selection, e.g. series.select(good_ind_all)
+        return TelemSeries(self.msid, self.times[mask], self.vals[mask], unit=self.unit, source=self.source)
+
+    def numpy(self):
+        return self.times, self.vals
+
+    def to_pandas(self, dates=True):
+        # Same "date"/"data" layout the notebooks already use; "date" is datetime64 or CXC secs
+        date = self.dates if dates else self.times
+        return pd.DataFrame({"date": date, "data": self.vals}, copy=False)
+
+    def to_arrow(self):
+        # pyarrow wraps primitive numpy buffers without copying
+        import pyarrow as pa
+
+        return pa.table({"times": pa.array(self.times), "vals": pa.array(self.vals)})
+
+
+def maude_series(msid, t1, t2, all_points=True, dtype=None, url_template=MAUDE_URL, raise_errors=False):
+    # (base URL)/<CHANNEL>/<querytype>.<format>?<query options separated by &>
+    # url_template can point at a local stand-in server for testing.
+    # A failed query (connection, HTTP status, bad JSON) gives an empty series, or raises with
+    # raise_errors=True so callers that cache or store results can tell it from "no data".
+    url = url_template.format(msid.lower(), t1, t2)
+    if all_points is True:
+        url += "&ap=t"
+
+    try:
+        with pipeline_stats.stage("fetch", msid):
+            resp = requests.get(url)
+            resp.raise_for_status()
+        pipeline_stats.count("fetch", msid, nbytes=len(resp.content))
+        with pipeline_stats.stage("decode", msid):
+            series = TelemSeries.from_maude_json(msid, resp.json(), dtype=dtype)
+        pipeline_stats.count("decode", msid, samples=len(series))
+    except Exception:
+        if raise_errors:
+            raise
+        series = TelemSeries.empty(msid, dtype=dtype or np.float64, source="maude")
+
+    return series
+
+
+def ska_series(msid, t1, t2, stat="5min"):
+    from cheta import fetch_eng
+
+    with pipeline_stats.stage("fetch", msid):
+        data = fetch_eng.Msid(msid, t1, t2, stat=stat)
+    pipeline_stats.count("fetch", msid, nbytes=data.times.nbytes + data.vals.nbytes, samples=len(data.vals))
+    return TelemSeries.from_msid(data)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Current caution/warning limits for an MSID, same lookup order as the anomaly notebook:
+# TDB mission safety limits -> latest G_LIMMON limits -> +/-9999 placeholders.
+
+import os
+import sys
+
+NO_LIMITS = {"caution_high": 9999, "warning_high": 9999, "caution_low": -9999, "warning_low": -9999}
+
+LIMIT_NAMES = ("warning_high", "caution_high", "caution_low", "warning_low")
+
+
+def _pylimmon():
+    try:
+        import pylimmon
+    except ImportError:
+        sys.path.append(os.path.expanduser("~") + "/AXAFLIB/pylimmon/")
+        import pylimmon
+    return pylimmon
+
+
+def get_current_limits(msid):
+    # {"caution_high", "warning_high", "caution_low", "warning_low", "source"}
+    pylimmon = _pylimmon()
+
+    try:
+        safety_limits = pylimmon.get_mission_safety_limits(msid)
+    except IndexError:
+        safety_limits = None
+
+    if safety_limits:
+        limits = {name: safety_limits[name][-1] for name in LIMIT_NAMES}
+        limits["source"] = "tdb"
+        return limits
+
+    try:
+        glimmon_limits = pylimmon.get_latest_glimmon_limits(msid)
+        limits = {name: glimmon_limits[name] for name in LIMIT_NAMES}
+        limits["source"] = "glimmon"
+    except TypeError:
+        limits = dict(NO_LIMITS, source=None)
+    return limits
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Unit normalization for mixed-unit reports and plots. The thermal list mixes DEGC, DEGF and K
+# MSIDs; convert whole value arrays and report tables to one target unit at the report / plot
+# boundary instead of element by element.
+#
+#     unit_conversion.convert(vals, "DEGC", "DEGF")                          # new array
+#     unit_conversion.convert(vals, "K", "DEGC", out=vals)                   # in place (float arrays)
+#     unit_conversion.normalize_table(anom_max_df, ["Max Temp", "Caution High", "Warning High"], "DEGF")
+#     unit_conversion.normalize_series(series, "DEGC")                        # TelemSeries, in place
+#
+# Every temperature unit is an affine map from Celsius, so any pair of units is
+# (value - add_from) / mult_from * mult_to + add_to, and a column of mixed units is the same
+# expression with per-row arrays. (Going through C rather than a single scale/offset keeps
+# 100 C -> 212 F and 212 F -> 100 C exact.)
+# Rates and spreads (delta=True) drop the offsets. Units that are not temperatures (V, AMP,
+# ...) are left untouched, as are the +/-9999 "no limit" placeholders.
+
+import numpy as np
+import pandas as pd
+
+import thermal_limits
+
+# unit -> (mult, add) with value = mult * celsius + add
+FROM_CELSIUS = {
+    "DEGC": (1.0, 0.0),
+    "DEGF": (1.8, 32.0),
+    "K": (1.0, 273.15),
+}
+
+# Spellings seen in the TDB, cheta and MAUDE unit strings
+ALIASES = {
+    "DEGK": "K",
+    "KELVIN": "K",
+    "C": "DEGC",
+    "DEG C": "DEGC",
+    "DEG_C": "DEGC",
+    "CELSIUS": "DEGC",
+    "F": "DEGF",
+    "DEG F": "DEGF",
+    "DEG_F": "DEGF",
+    "FAHRENHEIT": "DEGF",
+}
+
+NO_LIMIT = 9999
+
+
+def canonical(unit):
+    # "degC", "DEG C", "C" -> "DEGC"; anything that is not a temperature comes back stripped/upper-case
+    if unit is None or (isinstance(unit, float) and np.isnan(unit)):
+        return None
+    unit = str(unit).strip().upper()
+    return ALIASES.get(unit, unit)
+
+
+def is_temperature(unit):
+    return canonical(unit) in FROM_CELSIUS
+
+
+def factors(from_units, to_unit, delta=False):
+    # (sub, div, mul, add) so that value_in_to_unit = (value - sub) / div * mul + add. from_units
+    # may be one unit or an array of units (one per row); non-temperature units get (0, 1, 1, 0).
+    # delta=True (rates, spreads) drops the offsets.
+    to_unit = canonical(to_unit)
+    if to_unit not in FROM_CELSIUS:
+        raise ValueError(f"Unknown target unit {to_unit!r}, expected one of {sorted(FROM_CELSIUS)}")
+    mul, add = FROM_CELSIUS[to_unit]
+
+    scalar = np.ndim(from_units) == 0
+    kinds = [canonical(from_units)] if scalar else [canonical(u) for u in from_units]
+    # Per distinct unit, not per row: a report has a handful of units and thousands of rows
+    lookup = {}
+    for kind in set(kinds):
+        if kind in FROM_CELSIUS:
+            div, sub = FROM_CELSIUS[kind]
+            lookup[kind] = (0.0, div, mul, 0.0) if delta else (sub, div, mul, add)
+        else:
+            lookup[kind] = (0.0, 1.0, 1.0, 0.0)
+    terms = np.array([lookup[k] for k in kinds]).T
+    return tuple(t[0] for t in terms) if scalar else tuple(terms)
+
+
+def convert(vals, from_unit, to_unit, delta=False, out=None):
+    # Whole-array conversion; pass out=vals to convert a float array in place
+    sub, div, mul, add = factors(from_unit, to_unit, delta=delta)
+    vals = np.asarray(vals)
+    if out is None:
+        out = np.empty(vals.shape, dtype=np.result_type(vals.dtype, np.float32))
+    np.subtract(vals, sub, out=out)
+    np.divide(out, div, out=out)
+    np.multiply(out, mul, out=out)
+    np.add(out, add, out=out)
+    return out if out.ndim else out[()]
+
+
+def normalize_table(df, value_cols, to_unit, unit_col="Units", delta_cols=(), keep_placeholders=True):
+    # Convert value_cols (and the scale-only delta_cols, e.g. rates) of a report table to to_unit,
+    # row by row according to unit_col, then set unit_col. Modifies df in place and returns it.
+    if not len(df):
+        return df
+    from_units = df[unit_col].to_numpy(dtype=object)
+    sub, div, mul, add = factors(from_units, to_unit)
+    converts = np.array([is_temperature(u) for u in from_units])
+    for col in value_cols:
+        vals = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+        new = (vals - sub) / div * mul + add
+        if keep_placeholders:
+            new = np.where(np.abs(vals) == NO_LIMIT, vals, new)
+        df[col] = new
+    for col in delta_cols:
+        vals = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+        df[col] = vals / div * mul
+    df.loc[converts, unit_col] = canonical(to_unit)
+    return df
+
+
+def normalize_limits(limits, from_unit, to_unit):
+    # Limit dict as thermal_limits.get_current_limits returns it ({"caution_high": ..., "source": ...},
+    # scalars or arrays) in to_unit. Only the LIMIT_NAMES keys are converted, placeholders kept;
+    # other keys ("source", ...) pass through unchanged.
+    out = dict(limits)
+    for name in thermal_limits.LIMIT_NAMES:
+        if name not in limits:
+            continue
+        val = np.asarray(limits[name], dtype=np.float64)
+        new = convert(val, from_unit, to_unit)
+        out[name] = np.where(np.abs(val) == NO_LIMIT, val, new)
+        if np.ndim(out[name]) == 0:
+            out[name] = float(out[name])
+    return out
+
+
+def normalize_series(series, to_unit, from_unit=None):
+    # TelemSeries / fetch_eng.Msid-like object (.vals, .unit): vals converted in place when they
+    # are floating point, replaced by a float array otherwise
+    from_unit = from_unit or series.unit
+    if not is_temperature(from_unit):
+        return series
+    vals = series.vals
+    if np.issubdtype(vals.dtype, np.floating) and vals.flags.writeable:
+        convert(vals, from_unit, to_unit, out=vals)
+    else:
+        series.vals = convert(vals, from_unit, to_unit)
+    series.unit = canonical(to_unit)
+    return series